@@ -9,14 +9,14 @@ import warnings
 import asyncio
 import uuid
 import io
+import json
+import threading
 
-import selenium
 from google.adk.agents.llm_agent import Agent
 from google.adk.tools.load_artifacts_tool import load_artifacts_tool
 from google.adk.tools.tool_context import ToolContext
 from google.genai import types
 from PIL import Image
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.remote.webelement import WebElement
@@ -27,19 +27,52 @@ from google.adk.artifacts import InMemoryArtifactService
 
 from ....shared_libraries import constants
 from . import prompt
+from .bid_results import extract_bids, merge_bids
+from .dom_distiller import describe_page_update, distill_html, looks_like_html, outline_nodes
+from .driver_pool import driver_pool, run_in_browser_thread
 
 warnings.filterwarnings("ignore", category=UserWarning)
 
+# Session state key holding the id the session's WebDriver is leased under
+BROWSER_SESSION_KEY = "browser_session_id"
+
+# Caps portal searches running at once across every request in the process. A thread
+# semaphore rather than an asyncio one: Flask's async views run each request on its own event
+# loop, and an asyncio.Semaphore is bound to the first loop that waits on it.
+_portal_slots = threading.BoundedSemaphore(constants.DISCOVERY_MAX_CONCURRENT_PORTALS)
+# How often a portal search waiting for a slot checks again
+PORTAL_SLOT_POLL_SECONDS = 0.2
+
+# Fields each per-portal run is asked to return, so results from different portals can be merged
+BID_FIELDS = "title, agency, location, deadline, url, solicitation_number"
+
+
 class BidSearchAgent(Agent):
-    async def search_bids(self, user_id, keywords, naics_codes, geography, portals):
+    async def _run_async_impl(self, ctx):
+        # Inside the discovery manager's session every user turn is a new invocation, and the
+        # browser must stay on its page between turns (e.g. after asking the user a question).
+        # It is returned once this agent hands the conversation to another agent; runs started
+        # by _run_search return it when their session ends, and abandoned sessions are reclaimed
+        # by the pool's lease timeout.
+        async for event in super()._run_async_impl(ctx):
+            transfer_to = event.actions.transfer_to_agent if event.actions else None
+            if event.author == self.name and transfer_to and transfer_to != self.name:
+                await release_browser(ctx.session.state.get(BROWSER_SESSION_KEY))
+            yield event
+
+    async def _run_search(self, user_id, initial_prompt, progress=None):
         """
-        Uses the LLM agent to search for bids based on the provided criteria.
+        Runs one agent session for `initial_prompt` and returns its final response.
+        `progress["last_text"]` tracks the latest model text, for salvaging a run that is cut off.
         """
         session_service = InMemorySessionService()
         artifact_service = InMemoryArtifactService()
         app_name = "bid_discovery"
         session_id = str(uuid.uuid4())
-        await session_service.create_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        # The session's tools share one pooled browser, returned to the pool when the search ends
+        await session_service.create_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, state={BROWSER_SESSION_KEY: session_id}
+        )
 
         runner = Runner(
             agent=self,
@@ -48,6 +81,29 @@ class BidSearchAgent(Agent):
             artifact_service=artifact_service,
         )
 
+        user_content = types.Content(role='user', parts=[types.Part(text=initial_prompt)])
+        final_response = None
+        
+        try:
+            async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=user_content):
+                if progress is not None and event.content and event.content.parts and event.content.parts[0].text:
+                    progress["last_text"] = event.content.parts[0].text
+                if event.is_final_response() and event.content and event.content.parts:
+                    final_response = event.content.parts[0].text
+        finally:
+            await release_browser(session_id)
+
+        return final_response
+
+    async def search_bids(self, user_id, keywords, naics_codes, geography, portals):
+        """
+        Uses the LLM agent to search for bids based on the provided criteria.
+        With several portals and fan-out enabled, each portal is searched by its own run.
+        """
+        if constants.DISCOVERY_FAN_OUT and portals and len(portals) > 1:
+            result = await self.search_portals(user_id, keywords, naics_codes, geography, portals)
+            return json.dumps(result["bids"])
+
         initial_prompt = (
             "Start a search on the following portals:"
             f" {', '.join(portals) if portals else 'any relevant portal'}."
@@ -55,56 +111,93 @@ class BidSearchAgent(Agent):
             f" NAICS Codes='{naics_codes}', Geography='{geography}'."
             " Find the top 3 bid opportunities and return their details in a JSON format."
         )
-        
-        user_content = types.Content(role='user', parts=[types.Part(text=initial_prompt)])
-        final_response = None
-        
-        async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=user_content):
-            if event.is_final_response() and event.content and event.content.parts:
-                final_response = event.content.parts[0].text
+        return await self._run_search(user_id, initial_prompt)
+
+    async def _search_portal(self, user_id, keywords, naics_codes, geography, portal):
+        """
+        Searches one portal within the per-portal timeout. Returns (bids, status); a run that
+        times out or fails keeps whatever bids its last answer already listed.
+        """
+        initial_prompt = (
+            f"Start a search on the following portal: {portal}."
+            f" Use the following criteria: Keywords='{keywords}',"
+            f" NAICS Codes='{naics_codes}', Geography='{geography}'."
+            " Find the top 3 bid opportunities and return them as a JSON array of objects"
+            f" with the keys: {BID_FIELDS}. Leave a key empty if the portal does not show it."
+        )
+        progress = {}
+        # Never block the event loop waiting for a slot; a search cancelled while waiting holds none
+        while not _portal_slots.acquire(blocking=False):
+            await asyncio.sleep(PORTAL_SLOT_POLL_SECONDS)
+        try:
+            final_response = await asyncio.wait_for(
+                self._run_search(user_id, initial_prompt, progress), timeout=constants.DISCOVERY_PORTAL_TIMEOUT_SECONDS
+            )
+            return extract_bids(final_response), "ok"
+        except asyncio.TimeoutError:
+            print(f"⌛ Search on {portal} timed out after {constants.DISCOVERY_PORTAL_TIMEOUT_SECONDS}s.")
+            return extract_bids(progress.get("last_text")), "timeout"
+        except Exception as e:
+            print(f"Error searching {portal}: {e}")
+            return extract_bids(progress.get("last_text")), f"error: {e}"
+        finally:
+            _portal_slots.release()
+
+    async def search_portals(self, user_id, keywords, naics_codes, geography, portals):
+        """
+        Searches every portal concurrently and merges the results.
+        Returns {"bids": merged de-duplicated bids, "portal_status": {portal: "ok" | "timeout" | "error: ..."}}.
+        """
+        results = await asyncio.gather(
+            *(self._search_portal(user_id, keywords, naics_codes, geography, portal) for portal in portals)
+        )
+        return {
+            "bids": merge_bids([(portal, bids) for portal, (bids, _) in zip(portals, results)]),
+            "portal_status": {portal: status for portal, (_, status) in zip(portals, results)},
+        }
+
+
+async def get_driver(tool_context: ToolContext):
+    """Returns the WebDriver leased to the tool's session, checking one out of the pool on first use."""
+    session_id = tool_context.state.get(BROWSER_SESSION_KEY)
+    if not session_id:
+        session_id = str(uuid.uuid4())
+        tool_context.state[BROWSER_SESSION_KEY] = session_id
+    # Checking out may wait for a free browser or start one, so it runs off the event loop
+    return await asyncio.to_thread(driver_pool.lease, session_id)
 
-        return final_response
 
-driver = None
+async def release_browser(session_id) -> None:
+    """Returns the session's WebDriver to the pool and forgets its last page outline."""
+    if not session_id:
+        return
+    _page_snapshots.pop(session_id, None)
+    await asyncio.to_thread(driver_pool.release, session_id)
 
 
-def get_driver():
-    """Initializes and returns a singleton Chrome WebDriver instance."""
-    global driver
-    if driver is None and not constants.DISABLE_WEB_DRIVER:
-        print("🚀 Initializing new Chrome WebDriver instance...")
-        options = Options()
-        options.add_argument("--window-size=1920x1080")
-        options.add_argument("--verbose")
-        # Use a unique user data directory to prevent session conflicts
-        user_data_dir = f"/tmp/selenium_{uuid.uuid4()}"
-        options.add_argument(f"user-data-dir={user_data_dir}")
-        driver = selenium.webdriver.Chrome(options=options)
-    return driver
+# ============================================
+# Browser Tools
+# ============================================
+# Selenium calls are blocking HTTP round trips to the browser, often for a whole page load.
+# Each tool is async and runs its WebDriver work on the browser executor, so concurrent
+# discovery sessions in one process overlap instead of stalling the event loop in turn.
 
 
-def go_to_url(url: str) -> str:
+async def go_to_url(url: str, tool_context: ToolContext) -> str:
     """Navigates the browser to the given URL."""
     print(f"🌐 Navigating to URL: {url}")  # Added print statement
-    local_driver = get_driver()
+    local_driver = await get_driver(tool_context)
     if not local_driver:
         return "WebDriver is disabled."
-    local_driver.get(url.strip())
+    await run_in_browser_thread(local_driver.get, url.strip())
+    driver_pool.record_navigation(tool_context.state.get(BROWSER_SESSION_KEY))
     return f"Navigated to URL: {url}"
 
 
-async def take_screenshot(tool_context: ToolContext) -> dict:
-    """Takes a screenshot and saves it with the given filename. called 'load artifacts' after to load the image"""
-    timestamp = time.strftime("%Y%m%d-%H%M%S")
-    filename = f"screenshot_{timestamp}.png"
-    print(f"📸 Taking screenshot and saving as: {filename}")
-    local_driver = get_driver()
-    if not local_driver:
-        return {"status": "error", "message": "WebDriver is disabled."}
+def _save_screenshot(local_driver, filename: str, page_source_filename: str) -> bytes:
     local_driver.save_screenshot(filename)
 
     # Save page source for debugging
-    page_source_filename = f"page_source_{timestamp}.html"
     with open(page_source_filename, "w", encoding="utf-8") as f:
         f.write(local_driver.page_source)
     print(f"📄 Page source saved as: {page_source_filename}")
@@ -114,9 +207,20 @@ async def take_screenshot(tool_context: ToolContext) -> dict:
     # Correctly encode the image to PNG bytes
     img_byte_arr = io.BytesIO()
     image.save(img_byte_arr, format='PNG')
-    img_bytes = img_byte_arr.getvalue()
+    return img_byte_arr.getvalue()
+
+
+async def take_screenshot(tool_context: ToolContext) -> dict:
+    """Takes a screenshot and saves it with the given filename. called 'load artifacts' after to load the image"""
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    filename = f"screenshot_{timestamp}.png"
+    print(f"📸 Taking screenshot and saving as: {filename}")
+    local_driver = await get_driver(tool_context)
+    if not local_driver:
+        return {"status": "error", "message": "WebDriver is disabled."}
+    img_bytes = await run_in_browser_thread(_save_screenshot, local_driver, filename, f"page_source_{timestamp}.html")
 
-    tool_context.save_artifact(
+    await tool_context.save_artifact(
         filename,
         types.Part.from_bytes(data=img_bytes, mime_type="image/png"),
     )
@@ -141,22 +245,21 @@ def _find_element(driver, selector: dict) -> WebElement | None:
     return None
 
 
-def click_at_coordinates(x: int, y: int) -> str:
-    """Clicks at the specified coordinates on the screen."""
-    local_driver = get_driver()
-    if not local_driver:
-        return "WebDriver is disabled."
+def _click_at_coordinates(local_driver, x: int, y: int) -> str:
     local_driver.execute_script(f"window.scrollTo({x}, {y});")
     local_driver.find_element(By.TAG_NAME, "body").click()
     return "Clicked at coordinates."
 
 
-def find_element_with_text(text: str) -> str:
-    """Finds an element on the page with the given text."""
-    print(f"🔍 Finding element with text: '{text}'")  # Added print statement
-    local_driver = get_driver()
+async def click_at_coordinates(x: int, y: int, tool_context: ToolContext) -> str:
+    """Clicks at the specified coordinates on the screen."""
+    local_driver = await get_driver(tool_context)
     if not local_driver:
         return "WebDriver is disabled."
+    return await run_in_browser_thread(_click_at_coordinates, local_driver, x, y)
+
+
+def _find_element_with_text(local_driver, text: str) -> str:
     try:
         element = local_driver.find_element(By.XPATH, f"//*[contains(text(), '{text}')]")
         if element:
@@ -169,15 +272,20 @@ def find_element_with_text(text: str) -> str:
         return "Element not interactable, cannot click."
 
 
-def click_element_with_text(text: str) -> str:
-    """Clicks on an element on the page with the given text."""
-    print(f"🖱️ Clicking element with text: '{text}'")  # Added print statement
-    local_driver = get_driver()
+async def find_element_with_text(text: str, tool_context: ToolContext) -> str:
+    """Finds an element on the page with the given text."""
+    print(f"🔍 Finding element with text: '{text}'")  # Added print statement
+    local_driver = await get_driver(tool_context)
     if not local_driver:
         return "WebDriver is disabled."
+    return await run_in_browser_thread(_find_element_with_text, local_driver, text)
+
+
+def _click_element_with_text(local_driver, text: str, session_id: str) -> str:
     try:
         element = local_driver.find_element(By.XPATH, f"//*[contains(text(), '{text}')]")
         element.click()
+        driver_pool.record_navigation(session_id)
         return f"Clicked element with text: {text}"
     except NoSuchElementException:
         return "Element not found, cannot click."
@@ -187,15 +295,18 @@ def click_element_with_text(text: str) -> str:
         return "Element click intercepted, cannot click."
 
 
-def enter_text_into_element(text_to_enter: str, selector: dict, press_enter_after: bool = False) -> str:
-    """Enters text into an element found by the given selector, optionally pressing Enter."""
-    print(
-        f"📝 Entering text '{text_to_enter}' into element found by: {selector}"
-    )
-    local_driver = get_driver()
+async def click_element_with_text(text: str, tool_context: ToolContext) -> str:
+    """Clicks on an element on the page with the given text."""
+    print(f"🖱️ Clicking element with text: '{text}'")  # Added print statement
+    local_driver = await get_driver(tool_context)
     if not local_driver:
         return "WebDriver is disabled."
+    return await run_in_browser_thread(
+        _click_element_with_text, local_driver, text, tool_context.state.get(BROWSER_SESSION_KEY)
+    )
 
+
+def _enter_text_into_element(local_driver, text_to_enter: str, selector: dict, press_enter_after: bool) -> str:
     element = _find_element(local_driver, selector)
     if element:
         try:
@@ -214,12 +325,20 @@ def enter_text_into_element(text_to_enter: str, selector: dict, press_enter_afte
         return f"Element not found with selector: {selector}"
 
 
-def enter_text_into_element_by_label(label_text: str, text_to_enter: str) -> str:
-    """Finds an input field by its label text and enters text into it."""
-    print(f"📝 Entering text '{text_to_enter}' into field labeled '{label_text}'")
-    local_driver = get_driver()
+async def enter_text_into_element(
+    text_to_enter: str, selector: dict, tool_context: ToolContext, press_enter_after: bool = False
+) -> str:
+    """Enters text into an element found by the given selector, optionally pressing Enter."""
+    print(
+        f"📝 Entering text '{text_to_enter}' into element found by: {selector}"
+    )
+    local_driver = await get_driver(tool_context)
     if not local_driver:
         return "WebDriver is disabled."
+    return await run_in_browser_thread(_enter_text_into_element, local_driver, text_to_enter, selector, press_enter_after)
+
+
+def _enter_text_into_element_by_label(local_driver, label_text: str, text_to_enter: str) -> str:
     try:
         # Find the label element
         label_element = local_driver.find_element(By.XPATH, f"//label[contains(., '{label_text}')]")
@@ -239,71 +358,112 @@ def enter_text_into_element_by_label(label_text: str, text_to_enter: str) -> str
         return f"Input field for label '{label_text}' is not interactable."
 
 
-def scroll_down_screen() -> str:
+async def enter_text_into_element_by_label(label_text: str, text_to_enter: str, tool_context: ToolContext) -> str:
+    """Finds an input field by its label text and enters text into it."""
+    print(f"📝 Entering text '{text_to_enter}' into field labeled '{label_text}'")
+    local_driver = await get_driver(tool_context)
+    if not local_driver:
+        return "WebDriver is disabled."
+    return await run_in_browser_thread(_enter_text_into_element_by_label, local_driver, label_text, text_to_enter)
+
+
+async def scroll_down_screen(tool_context: ToolContext) -> str:
     """Scrolls down the screen by a moderate amount."""
     print("⬇️ scroll the screen")  # Added print statement
-    local_driver = get_driver()
+    local_driver = await get_driver(tool_context)
     if not local_driver:
         return "WebDriver is disabled."
-    local_driver.execute_script("window.scrollBy(0, 500)")
+    await run_in_browser_thread(local_driver.execute_script, "window.scrollBy(0, 500)")
     return "Scrolled down the screen."
 
 
-def get_page_source() -> str:
+# Last page outline each browser session has seen, as (url, outline lines)
+_page_snapshots = {}
+
+
+def _read_page(local_driver, full_html: bool, previous_snapshot) -> tuple:
+    """Returns (text for the agent, new snapshot or None)."""
     LIMIT = 1000000
-    """Returns the current page source."""
+    page_source = local_driver.page_source
+    if full_html or not constants.DOM_DISTILL_ENABLED:
+        return page_source[0:LIMIT], None
+    url, lines = local_driver.current_url, outline_nodes(page_source)
+    # A different page is always sent in full
+    previous_lines = previous_snapshot[1] if previous_snapshot and previous_snapshot[0] == url else None
+    text, seen_lines = describe_page_update(previous_lines, lines)
+    # Remember only what the agent was sent; lines cut by the token budget come in the next read
+    return text, (url, seen_lines)
+
+
+async def get_page_source(tool_context: ToolContext, full_html: bool = False, full_snapshot: bool = False) -> str:
+    """
+    Returns the current page as a compact outline: headings, visible text, every link and
+    button, and every input with a selector usable by enter_text_into_element. If this page was
+    read before, only the lines that changed since then are returned, unless full_snapshot
+    is set. Set full_html to get the raw HTML instead (only needed when the outline is
+    missing something).
+    """
     print("📄 Getting page source...")  # Added print statement
-    local_driver = get_driver()
+    local_driver = await get_driver(tool_context)
     if not local_driver:
         return "WebDriver is disabled."
-    return local_driver.page_source[0:LIMIT]
+    session_id = tool_context.state.get(BROWSER_SESSION_KEY)
+    previous_snapshot = None if full_snapshot else _page_snapshots.get(session_id)
+    # Parsing a large page is CPU-bound, so it stays on the browser thread with the read
+    text, snapshot = await run_in_browser_thread(_read_page, local_driver, full_html, previous_snapshot)
+    if snapshot is not None:
+        _page_snapshots[session_id] = snapshot
+    return text
 
 
-def analyze_webpage_and_determine_action(
+async def analyze_webpage_and_determine_action(
     page_source: str, user_task: str, tool_context: ToolContext
 ) -> str:
     """Analyzes the webpage and determines the next action (scroll, click, etc.)."""
     print(
         "🤔 Analyzing webpage and determining next action..."
     )  # Added print statement
+    if constants.DOM_DISTILL_ENABLED and looks_like_html(page_source):
+        # Parsing up to a megabyte of HTML is CPU-bound; keep it off the event loop
+        page_source = await asyncio.to_thread(distill_html, page_source)
 
     analysis_prompt = f"""
     You are an expert web page analyzer.
     You have been tasked with controlling a web browser to achieve a user's goal.
     The user's task is: {user_task}
-    Here is the current HTML source code of the webpage:
-    ```html
+    Here is the current webpage, as an outline of its visible text and interactive elements.
+    Each input line ends with its selector JSON; links and buttons are clicked by their text:
+    ```
     {page_source}
     ```
 
     Based on the webpage content and the user's task, determine the next best action to take.
-    Consider actions like: completing page source, scrolling down to see more content, clicking on links or buttons to navigate, or entering text into input fields.
+    Consider actions like: scrolling down to see more content, clicking on links or buttons to navigate, or entering text into input fields.
 
     Think step-by-step:
     1. Briefly analyze the user's task and the webpage content.
-    2. If source code appears to be incomplete, complete it to make it valid html. Keep the product titles as is. Only complete missing html syntax
+    2. If the outline ends with "outline truncated", the part of the page you need may not be shown yet.
     3. Identify potential interactive elements on the page (links, buttons, input fields, etc.).
     4. Determine if scrolling is necessary to reveal more content.
     5. Decide on the most logical next action to progress towards completing the user's task.
 
     Your response should be a concise action plan, choosing from these options:
-    - "COMPLETE_PAGE_SOURCE": If source code appears to be incomplete, complte it to make it valid html
     - "SCROLL_DOWN": If more content needs to be loaded by scrolling.
     - "CLICK: <element_text>": If a specific element with text <element_text> should be clicked. Replace <element_text> with the actual text of the element.
-    - "ENTER_TEXT: <selector_json>, <text_to_enter>, <press_enter>": If text needs to be entered into an input field. Replace <selector_json> with a JSON object like {"id": "search_box_id"}, <text_to_enter> with the text, and <press_enter> with true or false.
+    - "ENTER_TEXT: <selector_json>, <text_to_enter>, <press_enter>": If text needs to be entered into an input field. Replace <selector_json> with the selector JSON shown for that input (e.g. {{"id": "search_box_id"}}), <text_to_enter> with the text, and <press_enter> with true or false.
     - "ENTER_TEXT_BY_LABEL: <label_text>, <text_to_enter>": If text needs to be entered into an input field identified by its label.
     - "TASK_COMPLETED": If you believe the user's task is likely completed on this page.
     - "STUCK": If you are unsure what to do next or cannot progress further.
     - "ASK_USER": If you need clarification from the user on what to do next.
 
-    If you choose "CLICK" or "ENTER_TEXT", ensure the element text or ID is clearly identifiable from the webpage source. If multiple similar elements exist, choose the most relevant one based on the user's task.
+    If you choose "CLICK" or "ENTER_TEXT", ensure the element text or ID is clearly identifiable from the webpage outline. If multiple similar elements exist, choose the most relevant one based on the user's task.
     If you are unsure, or if none of the above actions seem appropriate, default to "ASK_USER".
 
     Example Responses:
     - SCROLL_DOWN
     - CLICK: Learn more
-    - ENTER_TEXT: {"id": "search_box_id"}, Gemini API, false
-    - ENTER_TEXT: {"name": "keyword-text"}, New Jersey, true
+    - ENTER_TEXT: {{"id": "search_box_id"}}, Gemini API, false
+    - ENTER_TEXT: {{"name": "keyword-text"}}, New Jersey, true
     - ENTER_TEXT_BY_LABEL: Username, my_user_name
     - TASK_COMPLETED
     - STUCK
@@ -0,0 +1,71 @@
+# search_results/bid_results.py
+
+# Parsing and merging of the bid lists returned by per-portal search runs
+
+import re
+import json
+
+# Keys that identify the same opportunity across portals, in order of reliability
+_ID_KEYS = ("solicitation_number", "notice_id", "url", "link")
+_FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+
+def extract_bids(text: str) -> list:
+    """
+    Returns the bid dicts in an agent's answer, or [] if it holds none. Accepts a bare JSON
+    array, an object with a "bids" array, or either one wrapped in a ```json fence or in prose.
+    """
+    if not text:
+        return []
+    candidates = _FENCE_PATTERN.findall(text) + [text]
+    for candidate in candidates:
+        for opening, closing in (("[", "]"), ("{", "}")):
+            start, end = candidate.find(opening), candidate.rfind(closing)
+            if start == -1 or end <= start:
+                continue
+            try:
+                parsed = json.loads(candidate[start:end + 1])
+            except json.JSONDecodeError:
+                continue
+            if isinstance(parsed, dict):
+                parsed = parsed.get("bids", [])
+            if isinstance(parsed, list):
+                return [bid for bid in parsed if isinstance(bid, dict)]
+    return []
+
+
+def _normalize(value) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(value).lower())
+
+
+def _bid_keys(bid: dict) -> list:
+    """ Every key the bid can be matched on: its identifiers, then its title and agency. """
+    keys = [f"{key}:{_normalize(bid[key])}" for key in _ID_KEYS if bid.get(key)]
+    if bid.get("title"):
+        keys.append(f"title:{_normalize(bid['title'])}|{_normalize(bid.get('agency', ''))}")
+    return keys
+
+
+def merge_bids(bid_lists: list) -> list:
+    """
+    Merges per-portal bid lists into one, in order. A bid matching an earlier one on any
+    identifier, or on title and agency, is folded into it: missing details are filled in and
+    the portals it was found on are collected in "portals".
+    """
+    merged, index = [], {}
+    for portal, bids in bid_lists:
+        for bid in bids:
+            keys = _bid_keys(bid)
+            existing = next((index[key] for key in keys if key in index), None)
+            if existing is None:
+                existing = {**bid, "portals": []}
+                merged.append(existing)
+            else:
+                for key, value in bid.items():
+                    if value and not existing.get(key):
+                        existing[key] = value
+            if portal not in existing["portals"]:
+                existing["portals"].append(portal)
+            for key in keys:
+                index.setdefault(key, existing)
+    return merged
@@ -0,0 +1,306 @@
+# search_results/dom_distiller.py
+
+# Reduces a page's HTML to the outline the agent actually reads: visible text plus the
+# interactive elements, with a selector for the form controls the browser tools type into
+
+import re
+import json
+import difflib
+
+from bs4 import BeautifulSoup, Comment, NavigableString, Tag
+
+from ....shared_libraries import constants
+
+# Rough size of a token in characters, used to hold the outline to its token budget
+CHARS_PER_TOKEN = 4
+# Longest text kept for a single line or element label
+MAX_LINE_CHARS = 300
+
+# Never visible or meaningful to the agent
+_DROPPED_TAGS = {"script", "style", "svg", "noscript", "template", "iframe", "canvas", "link", "meta",
+                 "head", "object", "embed", "picture", "video", "audio", "map"}
+_INTERACTIVE_TAGS = {"a", "button", "input", "select", "textarea"}
+# Only these are addressed by selector (enter_text_into_element); links and buttons are clicked by their text
+_FORM_TAGS = {"input", "select", "textarea"}
+_INTERACTIVE_ROLES = {"button", "link", "tab", "checkbox", "radio", "menuitem", "option", "switch", "combobox",
+                      "searchbox", "textbox"}
+_HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+# Tags that end the current line of text
+_BLOCK_TAGS = {"address", "article", "aside", "blockquote", "br", "dd", "details", "dialog", "div", "dl", "dt",
+               "fieldset", "figcaption", "figure", "footer", "form", "header", "hr", "li", "main", "nav", "ol",
+               "p", "pre", "section", "summary", "table", "tbody", "td", "tfoot", "th", "thead", "tr", "ul"}
+_HIDDEN_STYLE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.IGNORECASE)
+# Ids generated by frameworks (ember123, react-select-5-input, ...) change between page loads
+_GENERATED_ID = re.compile(r"\d{3,}|^(ember|react|ng|mat|cdk|ui-id)[-_]?\d|[0-9a-f]{8}-[0-9a-f]{4}", re.IGNORECASE)
+
+
+def _collapse(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _clip(text: str, limit: int = MAX_LINE_CHARS) -> str:
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def _is_hidden(tag: Tag) -> bool:
+    if tag.has_attr("hidden") or tag.get("aria-hidden") == "true":
+        return True
+    if tag.name == "input" and (tag.get("type") or "").lower() == "hidden":
+        return True
+    return bool(_HIDDEN_STYLE.search(tag.get("style") or ""))
+
+
+def _is_interactive(tag: Tag) -> bool:
+    if tag.name in _INTERACTIVE_TAGS:
+        return tag.name != "a" or tag.has_attr("href") or tag.has_attr("onclick")
+    if (tag.get("role") or "").lower() in _INTERACTIVE_ROLES or tag.has_attr("onclick"):
+        # A clickable container (e.g. a whole result card) is described through its own controls
+        return tag.find(list(_INTERACTIVE_TAGS)) is None
+    return False
+
+
+def _stable_id(tag: Tag):
+    tag_id = tag.get("id")
+    return tag_id if tag_id and not _GENERATED_ID.search(tag_id) else None
+
+
+def _css_path(tag: Tag) -> str:
+    """ CSS path from the nearest ancestor with a stable id (or the root), using :nth-of-type steps. """
+    steps = []
+    node = tag
+    while isinstance(node, Tag) and node.name not in ("[document]", "html"):
+        node_id = _stable_id(node)
+        if node_id and node is not tag:
+            steps.append(f"#{node_id}")
+            break
+        if node.name == "body":
+            steps.append("body")
+            break
+        position = sum(1 for sibling in node.previous_siblings if isinstance(sibling, Tag) and sibling.name == node.name)
+        steps.append(f"{node.name}:nth-of-type({position + 1})")
+        node = node.parent
+    return " > ".join(reversed(steps))
+
+
+def stable_selector(tag: Tag) -> dict:
+    """
+    Returns a selector dict for `enter_text_into_element`, preferring attributes that survive
+    re-renders: a non-generated id, then the name, then test ids and labels, then a CSS path.
+    """
+    tag_id = _stable_id(tag)
+    if tag_id:
+        return {"id": tag_id}
+    if tag.get("name"):
+        return {"name": tag["name"]}
+    for attribute in ("data-testid", "data-test", "data-qa", "aria-label"):
+        value = tag.get(attribute)
+        if value and '"' not in value:
+            return {"css": f'{tag.name}[{attribute}="{value}"]'}
+    return {"css": _css_path(tag)}
+
+
+def _label(tag: Tag) -> str:
+    text = _collapse(tag.get_text(" "))
+    for attribute in ("aria-label", "title", "alt", "placeholder", "value"):
+        if text:
+            break
+        text = _collapse(tag.get(attribute) or "")
+    if not text:
+        image = tag.find("img", alt=True)
+        text = _collapse(image["alt"]) if image else ""
+    return _clip(text)
+
+
+def _describe_interactive(tag: Tag) -> str:
+    """
+    One outline line for an interactive element, e.g. `[link] "Search" href=/search` or
+    `[input:text] placeholder="Keyword" {"name": "q"}`. Only form controls carry a selector.
+    """
+    if tag.name == "a":
+        kind = "link"
+    elif tag.name == "input":
+        kind = f"input:{(tag.get('type') or 'text').lower()}"
+    elif tag.name in _INTERACTIVE_TAGS:
+        kind = tag.name
+    else:
+        kind = (tag.get("role") or "clickable").lower()
+    parts = [f"[{kind}]"]
+    label = _label(tag) if tag.name not in _FORM_TAGS else ""
+    if label:
+        parts.append(json.dumps(label))
+    for attribute in ("placeholder", "aria-label") if tag.name in _FORM_TAGS else ():
+        if tag.get(attribute):
+            parts.append(f"{attribute}={json.dumps(_clip(_collapse(tag[attribute]), 80))}")
+    if tag.name == "input" and tag.get("value") and (tag.get("type") or "text").lower() != "password":
+        parts.append(f"value={json.dumps(_clip(tag['value'], 80))}")
+    if tag.has_attr("checked"):
+        parts.append("checked")
+    if tag.has_attr("disabled"):
+        parts.append("disabled")
+    if tag.name == "select":
+        options = [_collapse(option.get_text(" ")) for option in tag.find_all("option")]
+        shown = ", ".join(json.dumps(option) for option in options[:10] if option)
+        parts.append(f"options=[{shown}{', ...' if len(options) > 10 else ''}]")
+    if tag.name == "a" and tag.get("href") and not tag["href"].startswith("javascript:"):
+        parts.append(f"href={_clip(tag['href'], 200)}")
+    if tag.name in _FORM_TAGS:
+        parts.append(json.dumps(stable_selector(tag)))
+    return " ".join(parts)
+
+
+def outline_nodes(html: str) -> list:
+    """
+    Returns the page outline as a list of lines in document order: the title, headings
+    ("## ..."), text blocks and one line per visible interactive element.
+    """
+    soup = BeautifulSoup(html, "lxml")
+    lines = []
+    title = soup.title.get_text(" ") if soup.title else ""
+    if _collapse(title):
+        lines.append(f"Title: {_clip(_collapse(title))}")
+    root = soup.body or soup
+
+    text_buffer = []
+
+    def flush_text():
+        text = _collapse(" ".join(text_buffer))
+        text_buffer.clear()
+        if text and (not lines or lines[-1] != text):
+            lines.append(_clip(text))
+
+    # Iterative walk; a None entry marks the end of a block element
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            flush_text()
+            continue
+        if isinstance(node, NavigableString):
+            if not isinstance(node, Comment) and type(node) is NavigableString:
+                text_buffer.append(str(node))
+            continue
+        if not isinstance(node, Tag) or node.name in _DROPPED_TAGS or _is_hidden(node):
+            continue
+        if _is_interactive(node):
+            flush_text()
+            lines.append(_describe_interactive(node))
+            continue
+        if node.name in _HEADINGS:
+            flush_text()
+            heading = _collapse(node.get_text(" "))
+            if heading:
+                marker = "#" * _HEADINGS[node.name]
+                controls = [tag for tag in node.find_all(list(_INTERACTIVE_TAGS)) if _is_interactive(tag)]
+                # Result titles are usually links inside headings; keep the link's target
+                if controls and _collapse(" ".join(_label(tag) for tag in controls)) == heading:
+                    lines.extend(f"{marker} {_describe_interactive(tag)}" for tag in controls)
+                else:
+                    lines.append(f"{marker} {_clip(heading)}")
+                    lines.extend(_describe_interactive(tag) for tag in controls)
+            continue
+        if node.name in _BLOCK_TAGS:
+            flush_text()
+            stack.append(None)
+        stack.extend(reversed(node.contents))
+    flush_text()
+    return lines
+
+
+def _lines_within_budget(lines: list, token_budget: int) -> int:
+    """ Returns how many leading lines fit in the token budget. """
+    char_budget = token_budget * CHARS_PER_TOKEN
+    used = 0
+    for count, line in enumerate(lines):
+        used += len(line) + 1
+        if used > char_budget:
+            return count
+    return len(lines)
+
+
+def fit_to_budget(lines: list, token_budget: int) -> str:
+    """ Joins outline lines, stopping at the token budget and noting how many lines were cut. """
+    kept = _lines_within_budget(lines, token_budget)
+    text = "\n".join(lines[:kept])
+    if kept < len(lines):
+        text += (("\n" if kept else "") +
+                 f"... [outline truncated: {len(lines) - kept} more lines; read the page again to get them]")
+    return text
+
+
+def distill_html(html: str, token_budget: int = None) -> str:
+    """
+    Strips a page down to an outline of its visible text and interactive elements (links,
+    buttons, and inputs with stable selectors), within `token_budget` tokens.
+    """
+    return fit_to_budget(outline_nodes(html), token_budget or constants.DOM_DISTILL_TOKEN_BUDGET)
+
+
+def looks_like_html(text: str) -> bool:
+    """ True for raw markup, False for an outline this module already produced. """
+    return bool(re.match(r"\s*<(!doctype|html|head|body|div|\?xml)", text or "", re.IGNORECASE))
+
+
+# ============================================
+# Incremental Page Observations
+# ============================================
+# After a scroll or click most of the page is unchanged. Outline lines are the nodes compared:
+# the agent is sent only the added, removed and changed lines, each group anchored to the
+# unchanged line it follows. The lines compared against are the ones the agent was actually
+# sent, so lines cut off by the token budget show up as added on the next read.
+
+
+def diff_outlines(previous: list, current: list) -> dict:
+    """
+    Returns {"added", "removed", "changed", "lines", "sources"} describing how `current` differs
+    from `previous`. A replaced run of the same length counts as changed lines, anything else as
+    removed and added lines. `sources` gives, for each entry of `lines`, the index of the
+    `current` line it shows, or None for anchors and removed lines.
+    """
+    diff = {"added": 0, "removed": 0, "changed": 0, "lines": [], "sources": []}
+    # autojunk would treat lines repeated on every result card as noise and misalign the diff
+    matcher = difflib.SequenceMatcher(None, previous, current, autojunk=False)
+    for opcode, i1, i2, j1, j2 in matcher.get_opcodes():
+        if opcode == "equal":
+            continue
+        anchor = _clip(current[j1 - 1], 80) if j1 > 0 else "(top of page)"
+        diff["lines"].append(f"@@ after: {anchor}")
+        diff["sources"].append(None)
+        old_lines, new_lines = previous[i1:i2], current[j1:j2]
+        if opcode == "replace" and len(old_lines) == len(new_lines):
+            diff["changed"] += len(new_lines)
+            diff["lines"].extend(f"~ {new}  (was: {_clip(old, 120)})" for old, new in zip(old_lines, new_lines))
+            diff["sources"].extend(range(j1, j2))
+            continue
+        diff["removed"] += len(old_lines)
+        diff["added"] += len(new_lines)
+        diff["lines"].extend(f"- {line}" for line in old_lines)
+        diff["lines"].extend(f"+ {line}" for line in new_lines)
+        diff["sources"].extend([None] * len(old_lines) + list(range(j1, j2)))
+    return diff
+
+
+def describe_page_update(previous: list, current: list, token_budget: int = None) -> tuple:
+    """
+    Returns (text, seen): what the agent should see of `current` given it has seen the lines
+    `previous` (None for a new page), and the lines of `current` it has seen once it reads
+    that text. The text is the diff when there is one and it is smaller than the page,
+    otherwise the full outline; either is cut at the token budget, and the lines cut off are
+    left out of `seen` so the next call sends them.
+    """
+    token_budget = token_budget or constants.DOM_DISTILL_TOKEN_BUDGET
+    if previous == current:
+        return "No changes on the page since the last observation.", current
+    if previous is not None:
+        diff = diff_outlines(previous, current)
+        header = (f"Changes since the last observation ({diff['added']} added, {diff['removed']} removed, "
+                  f"{diff['changed']} changed lines; unchanged lines omitted):")
+        diff_lines = [header] + diff["lines"]
+        if sum(len(line) + 1 for line in diff_lines) < sum(len(line) + 1 for line in current):
+            kept = _lines_within_budget(diff_lines, token_budget)
+            # Lines the diff does not mention are unchanged, so already seen
+            unsent = {source for source in diff["sources"] if source is not None}
+            unsent -= set(source for source in diff["sources"][:max(kept - 1, 0)] if source is not None)
+            seen = [line for index, line in enumerate(current) if index not in unsent]
+            return fit_to_budget(diff_lines, token_budget), seen
+    kept = _lines_within_budget(current, token_budget)
+    return fit_to_budget(current, token_budget), current[:kept]
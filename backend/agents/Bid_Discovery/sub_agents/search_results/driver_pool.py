@@ -0,0 +1,290 @@
+# search_results/driver_pool.py
+
+# Bounded pool of Chrome WebDriver instances leased to discovery sessions
+
+import time
+import uuid
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import selenium
+from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import WebDriverException
+
+from ....shared_libraries import constants
+
+
+def create_chrome_driver():
+    """Starts a new Chrome WebDriver instance."""
+    print("🚀 Initializing new Chrome WebDriver instance...")
+    options = Options()
+    options.add_argument("--window-size=1920x1080")
+    options.add_argument("--verbose")
+    # Use a unique user data directory to prevent session conflicts
+    user_data_dir = f"/tmp/selenium_{uuid.uuid4()}"
+    options.add_argument(f"user-data-dir={user_data_dir}")
+    return selenium.webdriver.Chrome(options=options)
+
+
+class _PooledDriver:
+    """A WebDriver plus the bookkeeping the pool needs to decide when to recycle it."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.navigations = 0
+        self.last_used = time.monotonic()
+        self.last_health_check = time.monotonic()
+
+
+class WebDriverPool:
+    """
+    Bounded pool of WebDrivers. Each discovery session leases its own driver, so concurrent
+    sessions never share a browser tab and a crashed browser only affects its own session.
+
+    - At most `max_size` browsers exist at once; `lease` waits up to `checkout_timeout` seconds
+      for one to free up.
+    - Idle browsers are health-checked before they are handed out, and `min_idle` of them are
+      kept pre-warmed in the background.
+    - A browser is recycled when it is returned after `max_navigations` navigations or once its
+      JavaScript heap has grown past `max_memory_mb`.
+    - Leases untouched for `lease_timeout` seconds are reclaimed, for sessions that never
+      release their driver.
+    """
+
+    def __init__(self, max_size: int, min_idle: int, max_navigations: int, max_memory_mb: int,
+                 lease_timeout: float, checkout_timeout: float, factory=create_chrome_driver):
+        self.max_size = max_size
+        self.min_idle = min(min_idle, max_size)
+        self.max_navigations = max_navigations
+        self.max_memory_mb = max_memory_mb
+        self.lease_timeout = lease_timeout
+        self.checkout_timeout = checkout_timeout
+        self.factory = factory
+        self._idle = []
+        self._leased = {}
+        self._pending = 0  # Browsers being started, checked or quit outside the lock, counted against max_size
+        self._condition = threading.Condition()
+        self._maintenance_thread = None
+        self._closed = False
+
+    # ----- Health and recycling -----
+
+    def _is_healthy(self, entry: _PooledDriver) -> bool:
+        try:
+            entry.driver.execute_script("return 1")
+            entry.last_health_check = time.monotonic()
+            return True
+        except WebDriverException:
+            return False
+
+    def _memory_mb(self, entry: _PooledDriver) -> float:
+        """Current JavaScript heap of the browser's page in MB (0 if the browser does not report it)."""
+        try:
+            used_bytes = entry.driver.execute_script(
+                "return window.performance && performance.memory ? performance.memory.usedJSHeapSize : 0"
+            )
+            return (used_bytes or 0) / (1024 * 1024)
+        except WebDriverException:
+            return 0.0
+
+    def _needs_recycle(self, entry: _PooledDriver) -> bool:
+        if entry.navigations >= self.max_navigations:
+            return True
+        return self.max_memory_mb > 0 and self._memory_mb(entry) > self.max_memory_mb
+
+    def _quit(self, entry: _PooledDriver) -> None:
+        try:
+            entry.driver.quit()
+        except Exception as e:
+            print(f"Warning: Could not quit WebDriver cleanly: {e}")
+
+    # ----- Slot accounting -----
+    # A browser counts against max_size from the moment its slot is reserved in `_pending` until
+    # its process has quit. Entries move between pending and leased/idle in a single locked step,
+    # so no other thread ever sees a slot as free while its browser is still alive.
+
+    def _start(self):
+        """Starts a browser outside the lock; the caller has already reserved a slot in `_pending`."""
+        try:
+            return _PooledDriver(self.factory())
+        except Exception:
+            self._unreserve()
+            raise
+
+    def _unreserve(self) -> None:
+        with self._condition:
+            self._pending -= 1
+            self._condition.notify_all()
+
+    def _commit(self, entry: _PooledDriver, session_id: str = None) -> bool:
+        """
+        Moves a reserved entry to the session's lease, or to the idle list without a session.
+        Returns False (leaving the slot reserved) if the pool was shut down in the meantime.
+        """
+        with self._condition:
+            if self._closed:
+                return False
+            self._pending -= 1
+            if session_id is None:
+                self._idle.append(entry)
+            else:
+                self._leased[session_id] = entry
+            self._condition.notify_all()
+            return True
+
+    def _retire(self, entry: _PooledDriver) -> None:
+        """Quits a reserved entry's browser, and only then frees its slot."""
+        self._quit(entry)
+        self._unreserve()
+
+    def _size(self) -> int:
+        return len(self._idle) + len(self._leased) + self._pending
+
+    # ----- Leasing -----
+    # Browser calls (health checks, cleanup, start-up) never run under the lock, so one slow
+    # browser cannot hold up checkouts and returns for every other session.
+
+    def lease(self, session_id: str):
+        """
+        Returns the driver leased to `session_id`, checking one out for it on first use.
+        Returns None if the WebDriver is disabled. Raises TimeoutError if the pool stays full.
+        """
+        if constants.DISABLE_WEB_DRIVER:
+            return None
+        self._ensure_maintenance()
+        with self._condition:
+            entry = self._leased.get(session_id)
+        if entry is not None:
+            entry.last_used = time.monotonic()
+            if time.monotonic() - entry.last_health_check < 30 or self._is_healthy(entry):
+                return entry.driver
+            # The session's browser crashed; replace it (the session loses its page state)
+            print(f"⚠️ WebDriver for session {session_id} is unresponsive, replacing it.")
+            with self._condition:
+                crashed = self._leased.pop(session_id, None) is entry
+                if crashed:
+                    self._pending += 1
+            if crashed:
+                self._retire(entry)
+
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            with self._condition:
+                while not self._idle and self._size() >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No WebDriver became available within {self.checkout_timeout}s "
+                                           f"({self.max_size} browsers in use).")
+                    self._condition.wait(remaining)
+                entry = self._idle.pop() if self._idle else None
+                self._pending += 1
+            if entry is None:
+                entry = self._start()
+                break
+            if self._is_healthy(entry):
+                break
+            self._retire(entry)
+
+        entry.last_used = time.monotonic()
+        if not self._commit(entry, session_id):
+            self._retire(entry)
+            raise RuntimeError("The WebDriver pool has been shut down.")
+        return entry.driver
+
+    def record_navigation(self, session_id: str) -> None:
+        """Counts a page navigation against the session's driver."""
+        with self._condition:
+            entry = self._leased.get(session_id)
+            if entry is not None:
+                entry.navigations += 1
+
+    def release(self, session_id: str) -> None:
+        """Returns the session's driver to the pool, recycling it if it is worn out or unhealthy."""
+        with self._condition:
+            entry = self._leased.pop(session_id, None)
+            if entry is None:
+                return
+            self._pending += 1
+        reusable = False
+        if not self._closed and self._is_healthy(entry) and not self._needs_recycle(entry):
+            try:
+                # Leave nothing of the previous session behind for the next one
+                entry.driver.delete_all_cookies()
+                entry.driver.get("about:blank")
+                reusable = True
+            except WebDriverException:
+                pass
+        if reusable and self._commit(entry):
+            return
+        print(f"♻️ Recycling WebDriver after {entry.navigations} navigations.")
+        self._retire(entry)
+
+    # ----- Background maintenance -----
+
+    def _ensure_maintenance(self) -> None:
+        with self._condition:
+            if self._maintenance_thread is None and not self._closed:
+                self._maintenance_thread = threading.Thread(target=self._maintain, name="webdriver-pool", daemon=True)
+                self._maintenance_thread.start()
+
+    def _maintain(self) -> None:
+        """Reclaims abandoned leases and keeps `min_idle` browsers pre-warmed."""
+        while True:
+            with self._condition:
+                if self._closed:
+                    return
+                now = time.monotonic()
+                abandoned = [session_id for session_id, entry in self._leased.items()
+                             if now - entry.last_used > self.lease_timeout]
+                warm_up = len(self._idle) + self._pending < self.min_idle and self._size() < self.max_size
+                if warm_up:
+                    self._pending += 1
+            for session_id in abandoned:
+                print(f"⌛ Reclaiming WebDriver leased to inactive session {session_id}.")
+                self.release(session_id)
+            if warm_up:
+                try:
+                    entry = self._start()
+                    if not self._commit(entry):
+                        self._retire(entry)
+                except Exception as e:
+                    print(f"Warning: Could not pre-warm a WebDriver: {e}")
+            with self._condition:
+                self._condition.wait(1 if warm_up else 5)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {"idle": len(self._idle), "leased": len(self._leased), "pending": self._pending,
+                    "max_size": self.max_size}
+
+    def shutdown(self) -> None:
+        """Quits every browser, leased or idle."""
+        with self._condition:
+            self._closed = True
+            entries = self._idle + list(self._leased.values())
+            self._idle, self._leased = [], {}
+            self._condition.notify_all()
+        for entry in entries:
+            self._quit(entry)
+
+
+driver_pool = WebDriverPool(
+    max_size=constants.WEB_DRIVER_POOL_SIZE,
+    min_idle=constants.WEB_DRIVER_MIN_IDLE,
+    max_navigations=constants.WEB_DRIVER_MAX_NAVIGATIONS,
+    max_memory_mb=constants.WEB_DRIVER_MAX_MEMORY_MB,
+    lease_timeout=constants.WEB_DRIVER_LEASE_TIMEOUT_SECONDS,
+    checkout_timeout=constants.WEB_DRIVER_CHECKOUT_TIMEOUT_SECONDS,
+)
+
+
+# Dedicated threads for WebDriver calls, one per pooled browser. A session's calls are sequential,
+# so this is enough for every leased browser to be busy at once without queuing behind
+# unrelated blocking work on the event loop's default executor.
+browser_executor = ThreadPoolExecutor(max_workers=constants.WEB_DRIVER_POOL_SIZE, thread_name_prefix="webdriver")
+
+
+async def run_in_browser_thread(func, *args):
+    """Runs a blocking WebDriver call on the browser executor and awaits its result."""
+    return await asyncio.get_running_loop().run_in_executor(browser_executor, func, *args)
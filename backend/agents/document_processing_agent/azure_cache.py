@@ -0,0 +1,42 @@
+import json
+import hashlib
+
+from backend.agents.shared_libraries import constants
+from backend.agents.shared_libraries.utils import get_cache_dir
+from backend.agents.document_processing_agent.disk_cache import DiskLRUCache
+
+# ============================================
+# Content-Addressed Cache for Azure Layout Results
+# ============================================
+
+class AzureLayoutCache(DiskLRUCache):
+    """
+    On-disk cache of Azure Document Intelligence results. Entries are keyed by the SHA-256 of
+    the PDF bytes plus the model id (and page selection and add-on features), so re-analyzing
+    an unchanged file skips the Azure round-trip entirely. Entries are JSON files, evicted
+    least recently used first once the cache exceeds `max_bytes`.
+    """
+
+    extension = ".json"
+    load_errors = (OSError, json.JSONDecodeError)
+
+    @staticmethod
+    def make_key(pdf_sha256: str, model_id: str, pages: str = None, features: list = None) -> str:
+        """ Builds the cache key for a document hash, model id, optional page selection and add-on features. """
+        key = f"{pdf_sha256}|{model_id}|{pages or ''}"
+        if features:
+            key += "|" + ",".join(sorted(features))
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _load(self, path: str) -> dict:
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _dump(self, path: str, result: dict) -> None:
+        with open(path, "w") as f:
+            json.dump(result, f)
+
+
+azure_layout_cache = AzureLayoutCache(
+    get_cache_dir("azure_layout"), constants.AZURE_CACHE_MAX_MB * 1024 * 1024
+)
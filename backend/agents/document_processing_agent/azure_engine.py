@@ -0,0 +1,155 @@
+import os
+import random
+import asyncio
+import threading
+
+from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError
+from azure.ai.documentintelligence import DocumentIntelligenceClient
+from azure.ai.documentintelligence.aio import DocumentIntelligenceClient as AsyncDocumentIntelligenceClient
+from azure.ai.documentintelligence.models import AnalyzeResult, DocumentAnalysisFeature
+
+from backend.config import load_config
+from backend.agents.shared_libraries import constants
+from backend.agents.shared_libraries.utils import file_sha256, get_absolute_path
+from backend.agents.document_processing_agent.azure_cache import AzureLayoutCache, azure_layout_cache
+
+AZURE_LAYOUT_MODEL_ID = "prebuilt-layout"
+# Add-on features requested with every layout analysis; prebuilt-layout returns no key-value pairs without them
+AZURE_LAYOUT_FEATURES = [DocumentAnalysisFeature.KEY_VALUE_PAIRS]
+ANALYSIS_TIMEOUT_SECONDS = 600
+# Status codes Azure uses for throttling and transient overload
+RETRYABLE_STATUS_CODES = (429, 500, 503)
+
+# ============================================
+# Clients
+# ============================================
+# The sync client is process-wide. aio clients each own an aiohttp session bound to the running
+# event loop, so they are opened per analysis call and closed with `async with`.
+
+_credentials = None
+_sync_client = None
+_client_lock = threading.Lock()
+
+
+def get_azure_credentials() -> tuple:
+    """
+    Returns (endpoint, key) for Azure Document Intelligence, loading the configuration once
+    per process. Raises ValueError if the credentials are not configured.
+    """
+    global _credentials
+    if _credentials is None:
+        config = load_config()
+        endpoint = config.get('AZURE_DOC_INTEL_ENDPOINT')
+        key = config.get('AZURE_DOC_INTEL_KEY')
+        if not endpoint or not key:
+            raise ValueError("Azure Document Intelligence credentials are not configured.")
+        _credentials = (endpoint, key)
+    return _credentials
+
+
+def get_document_intelligence_client() -> DocumentIntelligenceClient:
+    """ Returns the process-wide synchronous client, creating it on first use. """
+    global _sync_client
+    with _client_lock:
+        if _sync_client is None:
+            endpoint, key = get_azure_credentials()
+            _sync_client = DocumentIntelligenceClient(endpoint=endpoint, credential=AzureKeyCredential(key))
+        return _sync_client
+
+
+def create_async_document_intelligence_client() -> AsyncDocumentIntelligenceClient:
+    """
+    Returns a new asyncio client. It owns an aiohttp session, so use it as `async with client:`
+    to close the session when the analyses that share it are done.
+    """
+    endpoint, key = get_azure_credentials()
+    return AsyncDocumentIntelligenceClient(endpoint=endpoint, credential=AzureKeyCredential(key))
+
+
+def get_cache_key(file_path: str, pages: str = None):
+    """ Returns the Azure layout cache key for a document, or None if caching is disabled. """
+    if not constants.AZURE_CACHE_ENABLED:
+        return None
+    return AzureLayoutCache.make_key(file_sha256(get_absolute_path(file_path)), AZURE_LAYOUT_MODEL_ID, pages,
+                                     AZURE_LAYOUT_FEATURES)
+
+
+def _retry_delay(error: HttpResponseError, attempt: int) -> float:
+    """ Honors Azure's Retry-After header when present, otherwise exponential backoff with jitter. """
+    retry_after = error.response.headers.get("Retry-After") if error.response is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return min(2 ** attempt, 60) + random.uniform(0, 1)
+
+# ============================================
+# Concurrent Analysis Engine
+# ============================================
+
+class AzureAnalysisEngine:
+    """
+    asyncio engine that analyzes many documents at once over one aio client, opened and closed
+    around each call. File bodies are streamed from disk instead of read into memory, at most
+    `max_concurrency` analyses run at a time, and throttled requests are retried with backoff.
+    Results go through the layout cache.
+    """
+
+    def __init__(self, max_concurrency: int = None, max_retries: int = 5):
+        self.max_concurrency = max_concurrency or constants.AZURE_MAX_CONCURRENCY
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def analyze(self, file_path: str, pages: str = None, client: AsyncDocumentIntelligenceClient = None) -> AnalyzeResult:
+        """
+        Analyzes one document (optionally a page selection like "1-3,7") and returns the
+        AnalyzeResult. Without a `client`, one is opened for this document and closed afterwards.
+        """
+        absolute_file_path = get_absolute_path(file_path)
+        cache_key = await asyncio.to_thread(get_cache_key, absolute_file_path, pages)
+        if cache_key:
+            cached_result = await asyncio.to_thread(azure_layout_cache.get, cache_key)
+            if cached_result is not None:
+                print(f"[DEBUG-AZURE] Cache hit for '{os.path.basename(file_path)}', skipping the Azure round-trip.")
+                return AnalyzeResult(cached_result)
+
+        if client is None:
+            async with create_async_document_intelligence_client() as own_client:
+                result = await self._analyze_with_retries(own_client, absolute_file_path, pages)
+        else:
+            result = await self._analyze_with_retries(client, absolute_file_path, pages)
+
+        if cache_key:
+            try:
+                await asyncio.to_thread(azure_layout_cache.put, cache_key, result.as_dict())
+            except Exception as e:
+                print(f"Warning: Could not cache Azure analysis result: {e}")
+        return result
+
+    async def _analyze_with_retries(self, client: AsyncDocumentIntelligenceClient, absolute_file_path: str,
+                                    pages: str = None) -> AnalyzeResult:
+        """ Sends one document to Azure, retrying throttled requests with backoff. """
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with open(absolute_file_path, "rb") as f:
+                        poller = await client.begin_analyze_document(
+                            AZURE_LAYOUT_MODEL_ID, f, pages=pages, features=AZURE_LAYOUT_FEATURES,
+                            content_type="application/octet-stream"
+                        )
+                        return await asyncio.wait_for(poller.result(), timeout=ANALYSIS_TIMEOUT_SECONDS)
+                except HttpResponseError as e:
+                    if e.status_code not in RETRYABLE_STATUS_CODES or attempt == self.max_retries:
+                        raise
+                    delay = _retry_delay(e, attempt)
+                    print(f"[DEBUG-AZURE] Azure returned {e.status_code} for '{os.path.basename(absolute_file_path)}', retrying in {delay:.1f}s.")
+                    await asyncio.sleep(delay)
+
+    async def analyze_many(self, file_paths: list) -> list:
+        """
+        Analyzes all documents concurrently. Returns one entry per path, in order: either the
+        AnalyzeResult or the exception raised for that document.
+        """
+        async with create_async_document_intelligence_client() as client:
+            return await asyncio.gather(*(self.analyze(path, client=client) for path in file_paths),
+                                        return_exceptions=True)
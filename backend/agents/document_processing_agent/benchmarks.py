@@ -0,0 +1,200 @@
+"""
+Micro-benchmarks for the local heuristics' geometry helpers, the blueprint formats and the
+page render cache.
+
+Run from the project root:
+    python -m backend.agents.document_processing_agent.benchmarks
+"""
+
+import json
+import os
+import random
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from backend.agents.document_processing_agent.blueprint import CompactBlueprint
+from backend.agents.document_processing_agent.render_cache import PageRenderCache
+from backend.agents.document_processing_agent.tools import merge_overlapping_rects
+
+
+def _legacy_merge_overlapping_rects(rects: list, tolerance: int = 5) -> list:
+    """ The previous single-pass merge, kept here for comparison. It misses overlaps with earlier merges. """
+    if not rects: return []
+    sorted_rects = sorted((fitz.Rect(r) for r in rects), key=lambda r: (r.y0, r.x0))
+    merged = []
+    current_merge_rect = sorted_rects[0]
+    for next_rect in sorted_rects[1:]:
+        expanded_rect = fitz.Rect(current_merge_rect)
+        expanded_rect.x1 += tolerance
+        expanded_rect.y1 += tolerance
+        if expanded_rect.intersects(next_rect):
+            current_merge_rect.include_rect(next_rect)
+        else:
+            merged.append(current_merge_rect)
+            current_merge_rect = next_rect
+    merged.append(current_merge_rect)
+    return merged
+
+
+def _pairwise_merge(rects: list, tolerance: int = 5) -> list:
+    """ O(n^2) reference union, used to check that the grid merge finds the same components. """
+    boxes = [fitz.Rect(r) for r in rects]
+    changed = True
+    while changed:
+        changed = False
+        result = []
+        for box in boxes:
+            for other in result:
+                if (box.x0 <= other.x1 + tolerance and other.x0 <= box.x1 + tolerance and
+                        box.y0 <= other.y1 + tolerance and other.y0 <= box.y1 + tolerance):
+                    other.x0, other.y0 = min(other.x0, box.x0), min(other.y0, box.y0)
+                    other.x1, other.y1 = max(other.x1, box.x1), max(other.y1, box.y1)
+                    changed = True
+                    break
+            else:
+                result.append(box)
+        boxes = result
+    return boxes
+
+
+def make_dense_form_page(count: int, seed: int = 0) -> list:
+    """
+    Builds `count` rects that look like a dense form page: rows of underscore runs and short
+    rules, with many runs split into touching fragments the way text extraction reports them.
+    """
+    rng = random.Random(seed)
+    rects = []
+    row_count = 60
+    per_row = -(-count // row_count)
+    for row in range(row_count):
+        y = 36 + row * 12
+        x = 36.0
+        for _ in range(per_row):
+            width = rng.uniform(2, 12)
+            rects.append(fitz.Rect(x, y, x + width, y + rng.choice((0, 1, 2))))
+            x += width + rng.choice((0, 2, 8))
+    rng.shuffle(rects)
+    return rects[:count]
+
+
+def benchmark_merge_overlapping_rects(sizes=(500, 2000, 5000), repeats: int = 3) -> None:
+    """ Times the grid merge against the legacy merge and the pairwise reference on dense pages. """
+    print(f"{'rects':>8} {'grid ms':>10} {'legacy ms':>10} {'pairwise ms':>12} {'grid/pairwise boxes':>20}")
+    for size in sizes:
+        rects = make_dense_form_page(size)
+        timings = {}
+        results = {}
+        for name, merge in (("grid", merge_overlapping_rects), ("legacy", _legacy_merge_overlapping_rects), ("pairwise", _pairwise_merge)):
+            best = float("inf")
+            for _ in range(repeats if name != "pairwise" else 1):
+                started_at = time.perf_counter()
+                results[name] = merge(rects)
+                best = min(best, time.perf_counter() - started_at)
+            timings[name] = best * 1000
+        print(f"{size:>8} {timings['grid']:>10.1f} {timings['legacy']:>10.1f} {timings['pairwise']:>12.1f} "
+              f"{len(results['grid']):>9}/{len(results['pairwise'])}")
+
+
+def make_blueprint_fields(count: int, seed: int = 0) -> list:
+    """ Builds `count` public-format fields spread over 300 pages, with repeated label names. """
+    rng = random.Random(seed)
+    labels = ["Name", "Date", "Title", "Address", "Phone", "Bid Amount", "Company", "Email"]
+    fields = []
+    for i in range(count):
+        x0, y0 = rng.random() * 0.6, rng.random() * 0.9
+        x1, y1 = x0 + 0.3, y0 + 0.02
+        fields.append({
+            "field_name": f"{rng.choice(labels)} {i % 40}", "field_type": "text", "is_required": False,
+            "page_number": 1 + i % 300,
+            "coordinates": [{"x": x0, "y": y0}, {"x": x1, "y": y0}, {"x": x1, "y": y1}, {"x": x0, "y": y1}],
+        })
+    return fields
+
+
+def benchmark_blueprint_formats(sizes=(1000, 10000, 50000)) -> None:
+    """ Times saving and loading a blueprint as indented JSON versus the compact .npz form. """
+    print(f"{'fields':>8} {'json save ms':>13} {'json load ms':>13} {'json KB':>9} {'npz save ms':>12} {'npz load ms':>12} {'npz KB':>8}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path, npz_path = os.path.join(tmp_dir, "blueprint.json"), os.path.join(tmp_dir, "blueprint.npz")
+        for size in sizes:
+            fields = make_blueprint_fields(size)
+            compact = CompactBlueprint.from_fields(fields)
+            timings = {}
+            started_at = time.perf_counter()
+            with open(json_path, "w") as f:
+                json.dump({"form_fields": fields}, f, indent=2)
+            timings["json_save"] = time.perf_counter() - started_at
+            started_at = time.perf_counter()
+            with open(json_path) as f:
+                json.load(f)
+            timings["json_load"] = time.perf_counter() - started_at
+            started_at = time.perf_counter()
+            compact.save(npz_path)
+            timings["npz_save"] = time.perf_counter() - started_at
+            started_at = time.perf_counter()
+            CompactBlueprint.load(npz_path)
+            timings["npz_load"] = time.perf_counter() - started_at
+            print(f"{size:>8} {timings['json_save'] * 1000:>13.1f} {timings['json_load'] * 1000:>13.1f} "
+                  f"{os.path.getsize(json_path) / 1024:>9.0f} {timings['npz_save'] * 1000:>12.1f} "
+                  f"{timings['npz_load'] * 1000:>12.1f} {os.path.getsize(npz_path) / 1024:>8.0f}")
+
+
+def make_render_pages(doc) -> dict:
+    """
+    Adds a born-digital page (text and drawn rules) and a scanned page (one full-page 300 DPI
+    JPEG) to `doc`, and returns {name: page index}.
+    """
+    vector_page = doc.new_page()
+    for row in range(40):
+        vector_page.insert_text((72, 60 + row * 17), "Lorem ipsum dolor sit amet, consectetur adipiscing", fontsize=10)
+        vector_page.draw_line((320, 62 + row * 17), (540, 62 + row * 17))
+
+    scanned_page = doc.new_page()
+    rng = np.random.default_rng(0)
+    pixels = np.full((3300, 2550), 245, dtype=np.uint8) + rng.integers(0, 10, (3300, 2550), dtype=np.uint8)
+    for y in range(300, 3000, 120):
+        pixels[y:y + 4, 600:2200] = 20
+    scan = fitz.Pixmap(fitz.csGRAY, 2550, 3300, pixels.tobytes(), False)
+    scanned_page.insert_image(scanned_page.rect, stream=scan.tobytes("jpeg"))
+    return {"vector": vector_page.number, "scanned": scanned_page.number}
+
+
+def benchmark_page_render_cache(dpis=(100, 300), repeats: int = 5) -> None:
+    """
+    Times rasterizing a page against reading its render back from the page render cache
+    (memmap plus one full pass over the pixels, as the detector does). The cache file is read
+    with a warm OS page cache, so the cached times are a lower bound.
+    """
+    print(f"{'page':>8} {'dpi':>5} {'render ms':>10} {'cached ms':>10} {'entry MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, "pages.pdf")
+        doc = fitz.open()
+        pages = make_render_pages(doc)
+        doc.save(pdf_path)
+        cache = PageRenderCache(tmp_dir, max_bytes=1 << 40)
+        with fitz.open(pdf_path) as doc:
+            for name, page_index in pages.items():
+                page = doc.load_page(page_index)
+                for dpi in dpis:
+                    started_at = time.perf_counter()
+                    for _ in range(repeats):
+                        pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+                        pixels = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.h, pix.w)
+                    render_time = (time.perf_counter() - started_at) / repeats
+                    key = PageRenderCache.make_key(name, page_index, dpi)
+                    cache.put(key, pixels)
+                    started_at = time.perf_counter()
+                    for _ in range(repeats):
+                        int(cache.get(key).sum())
+                    cached_time = (time.perf_counter() - started_at) / repeats
+                    print(f"{name:>8} {dpi:>5} {render_time * 1000:>10.1f} {cached_time * 1000:>10.1f} "
+                          f"{pixels.nbytes / 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    benchmark_merge_overlapping_rects()
+    benchmark_blueprint_formats()
+    benchmark_page_render_cache()
@@ -0,0 +1,124 @@
+import numpy as np
+
+# ============================================
+# Compact Blueprint Representation
+# ============================================
+# The tools' public blueprint format is a list of field dicts with four {"x", "y"} corner dicts
+# each. Internally a blueprint is held as columns instead: one float32 box row and one page
+# index per field, and field names/types interned into small tables. The binary form is a
+# NumPy .npz archive; JSON is only produced when a caller asks for it.
+
+BLUEPRINT_EXTENSION = "npz"
+_NAME_SEPARATOR = "\x00"
+# Tool summaries list at most this many distinct field names; the blueprint file has them all
+SUMMARY_MAX_FIELD_NAMES = 100
+
+
+def corners_to_box(coordinates) -> tuple:
+    """ Returns (x0, y0, x1, y1) from four corner dicts, or None if they are malformed. """
+    if not (isinstance(coordinates, list) and len(coordinates) == 4 and
+            all(isinstance(p, dict) and isinstance(p.get("x"), (int, float)) and isinstance(p.get("y"), (int, float))
+                for p in coordinates)):
+        return None
+    return coordinates[0]["x"], coordinates[0]["y"], coordinates[2]["x"], coordinates[2]["y"]
+
+
+def _encode_strings(strings: list) -> np.ndarray:
+    return np.frombuffer(_NAME_SEPARATOR.join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _decode_strings(buffer: np.ndarray, count: int) -> list:
+    return buffer.tobytes().decode("utf-8").split(_NAME_SEPARATOR) if count else []
+
+
+class CompactBlueprint:
+    """
+    Struct-of-arrays blueprint. `boxes` is an (N, 4) float32 array of page-normalized
+    x0, y0, x1, y1; `page_index` holds 0-based pages; `name_ids` and `type_ids` index into the
+    interned `names` and `types` tables; `required` holds the is_required flags.
+    """
+
+    def __init__(self, boxes, page_index, name_ids, names, type_ids, types, required):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.page_index = np.asarray(page_index, dtype=np.int32)
+        self.name_ids = np.asarray(name_ids, dtype=np.int32)
+        self.names = list(names)
+        self.type_ids = np.asarray(type_ids, dtype=np.uint8)
+        self.types = list(types)
+        self.required = np.asarray(required, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.page_index)
+
+    @classmethod
+    def from_fields(cls, form_fields) -> "CompactBlueprint":
+        """ Builds a compact blueprint from field dicts, skipping fields with malformed coordinates. """
+        boxes, page_index, name_ids, type_ids, required = [], [], [], [], []
+        name_table, type_table = {}, {}
+        for field in form_fields:
+            box = corners_to_box(field.get("coordinates"))
+            if box is None:
+                print(f"[DEBUG-BLUEPRINT] Skipping field '{field.get('field_name')}' due to invalid or malformed coordinates.")
+                continue
+            boxes.append(box)
+            page_index.append(field.get("page_number", 1) - 1)
+            name_ids.append(name_table.setdefault(field.get("field_name", "unnamed"), len(name_table)))
+            type_ids.append(type_table.setdefault(field.get("field_type", "text"), len(type_table)))
+            required.append(bool(field.get("is_required", False)))
+        return cls(boxes, page_index, name_ids, list(name_table), type_ids, list(type_table), required)
+
+    def iter_fields(self):
+        """ Yields the fields as public-format dicts, one at a time. """
+        for box, page, name_id, type_id, is_required in zip(self.boxes.tolist(), self.page_index.tolist(),
+                                                             self.name_ids.tolist(), self.type_ids.tolist(),
+                                                             self.required.tolist()):
+            x0, y0, x1, y1 = box
+            yield {
+                "field_name": self.names[name_id], "field_type": self.types[type_id],
+                "is_required": is_required, "page_number": page + 1,
+                "coordinates": [{"x": x0, "y": y0}, {"x": x1, "y": y0}, {"x": x1, "y": y1}, {"x": x0, "y": y1}],
+            }
+
+    def to_fields(self) -> list:
+        """ Returns the public JSON-ready list of field dicts. """
+        return list(self.iter_fields())
+
+    def field_names(self) -> list:
+        """ Returns every field's name, in field order. """
+        return [self.names[name_id] for name_id in self.name_ids.tolist()]
+
+    def field_types(self) -> list:
+        """ Returns every field's type, in field order. """
+        return [self.types[type_id] for type_id in self.type_ids.tolist()]
+
+    def save(self, path: str) -> None:
+        """ Writes the blueprint as an uncompressed .npz archive. """
+        with open(path, "wb") as f:
+            np.savez(f, boxes=self.boxes, page_index=self.page_index, name_ids=self.name_ids,
+                     names=_encode_strings(self.names), name_count=np.int32(len(self.names)),
+                     type_ids=self.type_ids, types=_encode_strings(self.types),
+                     type_count=np.int32(len(self.types)), required=self.required)
+
+    @classmethod
+    def load(cls, path: str) -> "CompactBlueprint":
+        """ Reads a blueprint written by `save`. """
+        with np.load(path) as archive:
+            return cls(archive["boxes"], archive["page_index"], archive["name_ids"],
+                       _decode_strings(archive["names"], int(archive["name_count"])),
+                       archive["type_ids"], _decode_strings(archive["types"], int(archive["type_count"])),
+                       archive["required"])
+
+    def summary(self) -> dict:
+        """
+        Returns the compact description the tools hand to the agent instead of the full field
+        list: the field count, the distinct field names (capped) and the pages with fields.
+        """
+        distinct_names = [self.names[name_id] for name_id in dict.fromkeys(self.name_ids.tolist())]
+        summary = {
+            "field_count": len(self),
+            "field_names": distinct_names[:SUMMARY_MAX_FIELD_NAMES],
+            "pages_with_fields": (np.unique(self.page_index) + 1).tolist(),
+        }
+        if len(distinct_names) > SUMMARY_MAX_FIELD_NAMES:
+            summary["field_names_truncated"] = True
+        return summary
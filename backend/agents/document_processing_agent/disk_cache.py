@@ -0,0 +1,98 @@
+import os
+import threading
+
+# ============================================
+# Size-Bounded On-Disk LRU Cache
+# ============================================
+
+class DiskLRUCache:
+    """
+    Base class for the on-disk caches: one file per entry in `cache_dir`, named after the key
+    plus `extension`. The directory is kept under `max_bytes` by evicting the least recently
+    used entries; a hit refreshes the entry's mtime. Subclasses define how an entry is read
+    (`_load`) and written (`_dump`), and which read errors count as a miss (`load_errors`).
+    """
+
+    extension = ""
+    load_errors = (OSError,)
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _load(self, path: str):
+        raise NotImplementedError
+
+    def _dump(self, path: str, value) -> None:
+        raise NotImplementedError
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{self.extension}")
+
+    def get(self, key: str):
+        """ Returns the cached value for `key`, or None on a miss. """
+        path = self._entry_path(key)
+        try:
+            value = self._load(path)
+            os.utime(path)  # Mark as recently used for LRU eviction
+        except self.load_errors:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value) -> None:
+        """ Stores a value, then evicts old entries until the cache fits in `max_bytes`. """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._entry_path(key)
+        # Write to a temp file and rename so concurrent readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self._dump(tmp_path, value)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def _entries(self) -> list:
+        """ Returns (mtime, size, path) for every cache entry. """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.extension):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self) -> None:
+        """ Removes least recently used entries until the total size is within `max_bytes`. """
+        with self._lock:
+            entries = sorted(self._entries())
+            total_bytes = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total_bytes -= size
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        """ Returns hit/miss counters for this process and the current size of the cache. """
+        entries = self._entries() if os.path.isdir(self.cache_dir) else []
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": len(entries),
+            "size_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
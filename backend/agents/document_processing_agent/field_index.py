@@ -0,0 +1,66 @@
+import json
+
+import fitz  # PyMuPDF
+
+# ============================================
+# Field Name -> Widget Index Stored in the PDF
+# ============================================
+# Filling used to walk every widget of every page to find a handful of names. The index maps
+# each field name to the page and /Annots position of its widgets. Positions are used instead
+# of xrefs because garbage-collecting saves renumber objects but keep each page's /Annots
+# order. The index is written into the document catalog under a private key, so it travels
+# with the fillable PDF and later fills skip the scan.
+
+FIELD_INDEX_KEY = "BidAgentFieldIndex"
+
+
+def build_field_index(doc) -> dict:
+    """ Scans every page's widgets and returns {field_name: [[page index, annot position], ...]}. """
+    index = {}
+    for page_num in range(len(doc)):
+        page = doc.load_page(page_num)
+        positions = {annot[0]: position for position, annot in enumerate(page.annot_xrefs())}
+        for widget in page.widgets():
+            if widget.field_name:
+                index.setdefault(widget.field_name, []).append([page_num, positions[widget.xref]])
+    return index
+
+
+def resolve_widget_xrefs(page, positions: list) -> list:
+    """
+    Maps /Annots positions on a page to widget xrefs. Returns None for a position that is out
+    of range or not a widget, which means the stored index is stale.
+    """
+    annots = page.annot_xrefs()
+    return [annots[position][0] if position < len(annots) and annots[position][1] == fitz.PDF_ANNOT_WIDGET else None
+            for position in positions]
+
+
+def read_field_index(doc):
+    """ Returns the index stored in the document catalog, or None if there is none. """
+    if not doc.is_pdf:
+        return None
+    value_type, value = doc.xref_get_key(doc.pdf_catalog(), FIELD_INDEX_KEY)
+    if value_type != "string":
+        return None
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return None
+
+
+def write_field_index(doc, index: dict) -> None:
+    """ Stores the index in the document catalog; it is saved with the document. """
+    doc.xref_set_key(doc.pdf_catalog(), FIELD_INDEX_KEY, fitz.get_pdf_str(json.dumps(index, separators=(",", ":"))))
+
+
+def load_field_index(doc, rebuild: bool = False) -> dict:
+    """
+    Returns the document's field index, building and storing it if it is missing (or if
+    `rebuild` is set, e.g. after a stored index turned out to be stale).
+    """
+    index = None if rebuild else read_field_index(doc)
+    if index is None:
+        index = build_field_index(doc)
+        write_field_index(doc, index)
+    return index
@@ -0,0 +1,147 @@
+import os
+import re
+import json
+import hashlib
+import threading
+
+import numpy as np
+import cv2
+import fitz  # PyMuPDF
+
+from backend.agents.shared_libraries import constants
+from backend.agents.shared_libraries.utils import get_cache_dir
+
+# ============================================
+# Page Layout Fingerprints
+# ============================================
+
+FINGERPRINT_DPI = 24  # Enough to capture a form's block structure; text is not legible at this size
+HASH_SIZE = 8  # The perceptual hash keeps the lowest HASH_SIZE x HASH_SIZE DCT frequencies (64 bits)
+
+
+def _perceptual_hash(page) -> int:
+    """ DCT perceptual hash of a low-resolution grayscale render, as a 64-bit integer. """
+    pix = page.get_pixmap(dpi=FINGERPRINT_DPI, colorspace=fitz.csGRAY, alpha=False)
+    img_data = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.h, pix.w)
+    resized = cv2.resize(img_data, (HASH_SIZE * 4, HASH_SIZE * 4), interpolation=cv2.INTER_AREA)
+    low_frequencies = cv2.dct(resized.astype(np.float32))[:HASH_SIZE, :HASH_SIZE].flatten()
+    # Compare against the median of the AC terms; the DC term only encodes overall brightness
+    bits = low_frequencies > np.median(low_frequencies[1:])
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def _text_skeleton(words: list) -> str:
+    """
+    Normalizes a page's words to lowercased alphanumeric tokens in reading order, dropping
+    punctuation and underscore blanks. Digits are kept: "Item 1" and "Item 2" pages must not
+    share a fingerprint, since their field names differ.
+    """
+    tokens = (re.sub(r"[^a-z0-9]", "", word[4].lower()) for word in words)
+    return " ".join(token for token in tokens if token)
+
+
+def page_fingerprint(page, textpage=None) -> dict:
+    """
+    Returns the layout fingerprint of a page: a perceptual hash of a low-resolution render,
+    a digest of the page size and normalized text skeleton, and whether the page has text.
+    Pages without text are never matched, so they skip the render and get no perceptual hash.
+    """
+    words = page.get_text("words", textpage=textpage or page.get_textpage())
+    text_skeleton = _text_skeleton(words)
+    skeleton = f"{round(page.rect.width)}x{round(page.rect.height)}|{text_skeleton}"
+    return {
+        "phash": f"{_perceptual_hash(page):016x}" if text_skeleton else None,
+        "text_hash": hashlib.sha256(skeleton.encode()).hexdigest(),
+        "has_text": bool(text_skeleton),
+    }
+
+
+def hamming_distance(phash_a: str, phash_b: str) -> int:
+    """ Number of differing bits between two hex-encoded perceptual hashes. """
+    return bin(int(phash_a, 16) ^ int(phash_b, 16)).count("1")
+
+# ============================================
+# Index of Known Layouts
+# ============================================
+
+INDEX_VERSION = 2  # Bumped whenever the fingerprint scheme changes
+
+class LayoutIndex:
+    """
+    Local index mapping page fingerprints to the form fields found on that layout before.
+    A page matches a stored layout when its text skeleton digest is identical and its
+    perceptual hash is within `max_distance` bits. Stored fields carry no page number; they
+    are re-numbered for whichever page matches. The index is one JSON file, rewritten
+    atomically on every change.
+
+    Pages without text (scans) are never looked up or recorded: they all share one text digest,
+    and a low-resolution perceptual hash alone cannot tell two similar scanned forms apart.
+    """
+
+    def __init__(self, index_path: str, max_distance: int):
+        self.index_path = index_path
+        self.max_distance = max_distance
+        self._layouts = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        """ Returns {text_hash: [layout entries]}, reading the index file on first use. """
+        if self._layouts is None:
+            try:
+                with open(self.index_path, "r") as f:
+                    data = json.load(f)
+                # Entries written under an older fingerprint scheme never match; start over
+                self._layouts = data.get("layouts", {}) if data.get("version") == INDEX_VERSION else {}
+            except (OSError, json.JSONDecodeError):
+                self._layouts = {}
+        return self._layouts
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        # Write to a temp file and rename so concurrent readers never see a partial index
+        tmp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": INDEX_VERSION, "layouts": self._layouts}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def lookup(self, fingerprint: dict):
+        """ Returns the stored layout entry closest to `fingerprint`, or None if no layout matches. """
+        if not fingerprint.get("has_text"):
+            return None
+        with self._lock:
+            candidates = self._load().get(fingerprint["text_hash"], [])
+            best, best_distance = None, self.max_distance + 1
+            for entry in candidates:
+                distance = hamming_distance(entry["phash"], fingerprint["phash"])
+                if distance < best_distance:
+                    best, best_distance = entry, distance
+            return best
+
+    def fields_for_page(self, fingerprint: dict, page_number: int):
+        """ Returns the stored form fields re-numbered to `page_number` (1-based), or None on a miss. """
+        entry = self.lookup(fingerprint)
+        if entry is None:
+            return None
+        return [{**field, "page_number": page_number} for field in entry["form_fields"]]
+
+    def add(self, fingerprint: dict, page_fields: list, source: str = "") -> None:
+        """ Records (or replaces) the form fields for a layout. Pages without text are not recorded. """
+        if not fingerprint.get("has_text"):
+            return
+        stored_fields = [{k: v for k, v in field.items() if k != "page_number"} for field in page_fields]
+        entry = {"phash": fingerprint["phash"], "form_fields": stored_fields, "source": source}
+        with self._lock:
+            candidates = self._load().setdefault(fingerprint["text_hash"], [])
+            candidates[:] = [c for c in candidates if hamming_distance(c["phash"], fingerprint["phash"]) > self.max_distance]
+            candidates.append(entry)
+            self._save()
+
+    def stats(self) -> dict:
+        """ Returns the number of known layouts. """
+        with self._lock:
+            return {"layouts": sum(len(entries) for entries in self._load().values())}
+
+
+layout_index = LayoutIndex(
+    os.path.join(get_cache_dir("layout_index"), "index.json"), constants.LAYOUT_MATCH_MAX_DISTANCE
+)
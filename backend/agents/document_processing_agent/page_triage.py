@@ -0,0 +1,79 @@
+import fitz  # PyMuPDF
+
+# ============================================
+# Page Classes
+# ============================================
+# Each class maps to the cheapest analysis tier that can handle it:
+#   blank/boilerplate -> skipped, vector form -> vector engine,
+#   scanned form -> OpenCV raster engine, prose -> Azure OCR.
+
+PAGE_BLANK = "blank"
+PAGE_VECTOR_FORM = "vector_form"
+PAGE_SCANNED_FORM = "scanned_form"
+PAGE_PROSE = "prose"
+
+# Thresholds in PDF points, matching the vector engine in tools.py
+MIN_RULE_LENGTH = 50 / 300 * 72
+MAX_RULE_THICKNESS = 20 / 300 * 72
+MIN_TEXT_CHARS = 50
+SCANNED_IMAGE_COVERAGE = 0.5
+
+
+def _count_form_geometry(page) -> int:
+    """ Counts drawn horizontal rules and rectangles that could be form blanks. """
+    max_width = page.rect.width * 0.9
+    count = 0
+    for path in page.get_drawings():
+        for item in path["items"]:
+            if item[0] == "l":
+                p1, p2 = item[1], item[2]
+                if abs(p1.y - p2.y) < MAX_RULE_THICKNESS and MIN_RULE_LENGTH <= abs(p2.x - p1.x) < max_width:
+                    count += 1
+            elif item[0] in ("re", "qu"):
+                rect = fitz.Rect(item[1]) if item[0] == "re" else item[1].rect
+                if MIN_RULE_LENGTH <= rect.width < max_width:
+                    count += 1
+    return count
+
+
+def _image_coverage(page) -> float:
+    """ Returns the fraction of the page area covered by raster images (capped at 1.0). """
+    page_area = abs(page.rect) or 1
+    covered = sum(abs(fitz.Rect(info["bbox"]) & page.rect) for info in page.get_image_info())
+    return min(covered / page_area, 1.0)
+
+
+def classify_page(page) -> str:
+    """
+    Classifies a page using only cheap content-stream checks (no rendering):
+    - scanned form: mostly covered by images and has no vector form geometry
+    - vector form: has drawn rules/boxes or underscore blanks
+    - prose: has text with colon-terminated labels but no geometry, so it needs OCR layout analysis
+    - blank: little or no text, or text with no form cues at all (instructions, cover letters)
+    """
+    textpage = page.get_textpage()
+    text = page.get_text(textpage=textpage)
+    geometry_count = _count_form_geometry(page)
+
+    if geometry_count == 0 and page.get_images() and _image_coverage(page) >= SCANNED_IMAGE_COVERAGE:
+        return PAGE_SCANNED_FORM
+    if len(text.strip()) < MIN_TEXT_CHARS and geometry_count == 0:
+        return PAGE_BLANK
+
+    words = [w[4] for w in page.get_text("words", textpage=textpage)]
+    if geometry_count > 0 or any("_" in word for word in words):
+        return PAGE_VECTOR_FORM
+    if any(word.endswith(":") for word in words):
+        return PAGE_PROSE
+    return PAGE_BLANK
+
+
+def triage_pages(doc, page_numbers: list = None) -> dict:
+    """
+    Classifies the pages of an open fitz document (all of them, or only `page_numbers`).
+    Returns {page_class: [0-based page indexes]}.
+    """
+    triage = {PAGE_BLANK: [], PAGE_VECTOR_FORM: [], PAGE_SCANNED_FORM: [], PAGE_PROSE: []}
+    for page_num in (range(len(doc)) if page_numbers is None else page_numbers):
+        triage[classify_page(doc.load_page(page_num))].append(page_num)
+    return triage
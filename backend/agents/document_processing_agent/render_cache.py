@@ -0,0 +1,103 @@
+import os
+import hashlib
+import threading
+
+import numpy as np
+import fitz  # PyMuPDF
+
+from backend.agents.shared_libraries import constants
+from backend.agents.shared_libraries.utils import file_sha256, get_cache_dir
+from backend.agents.document_processing_agent.disk_cache import DiskLRUCache
+
+# ============================================
+# Memory-Mapped Cache of Page Renders
+# ============================================
+
+_COLORSPACE_NAMES = {1: "gray", 3: "rgb", 4: "cmyk"}
+
+_document_hashes = {}
+_document_hashes_lock = threading.Lock()
+
+
+def document_sha256(file_path: str) -> str:
+    """
+    Returns the SHA-256 of a PDF, hashing the file only once per process for as long as its
+    size and modification time are unchanged.
+    """
+    stat = os.stat(file_path)
+    stamp = (file_path, stat.st_size, stat.st_mtime_ns)
+    with _document_hashes_lock:
+        digest = _document_hashes.get(stamp)
+    if digest is None:
+        digest = file_sha256(file_path)
+        with _document_hashes_lock:
+            _document_hashes[stamp] = digest
+    return digest
+
+
+class PageRenderCache(DiskLRUCache):
+    """
+    On-disk cache of page renders stored as `.npy` files. Entries are keyed by the SHA-256 of
+    the PDF bytes, the page index, the DPI and the colorspace, and are returned as read-only
+    `np.memmap` arrays, so a re-run maps the pixels straight from the page cache instead of
+    rasterizing the page again. Entries are evicted least recently used first once the cache
+    exceeds `max_bytes`; arrays already mapped stay valid after their file is removed.
+    """
+
+    extension = ".npy"
+    load_errors = (OSError, ValueError)
+
+    @staticmethod
+    def make_key(pdf_sha256: str, page_index: int, dpi: int, colorspace: str = "gray") -> str:
+        """ Builds the cache key for one page render. """
+        return hashlib.sha256(f"{pdf_sha256}|{page_index}|{dpi}|{colorspace}".encode()).hexdigest()
+
+    def _load(self, path: str) -> np.ndarray:
+        return np.load(path, mmap_mode="r")
+
+    def _dump(self, path: str, pixels: np.ndarray) -> None:
+        # A file object, since np.save appends ".npy" to a path that lacks it
+        with open(path, "wb") as f:
+            np.save(f, pixels)
+
+
+page_render_cache = PageRenderCache(
+    get_cache_dir("page_renders"), constants.RENDER_CACHE_MAX_MB * 1024 * 1024
+)
+
+
+def _render_key(page, dpi: int, colorspace) -> str:
+    """ Returns the cache key for a page render, or None if the page cannot be cached. """
+    if not constants.RENDER_CACHE_ENABLED or not page.parent.name or not os.path.isfile(page.parent.name):
+        return None
+    return PageRenderCache.make_key(document_sha256(page.parent.name), page.number, dpi,
+                                    _COLORSPACE_NAMES.get(colorspace.n, colorspace.name))
+
+
+def render_page(page, dpi: int, colorspace=fitz.csGRAY) -> np.ndarray:
+    """
+    Renders a whole page without alpha and returns its pixels as an (h, w) array for gray or
+    (h, w, n) otherwise. With the render cache enabled, a previously rendered page is returned
+    as a zero-copy memmap; a fresh render is stored for the next run.
+    """
+    cache_key = _render_key(page, dpi, colorspace)
+    if cache_key:
+        pixels = page_render_cache.get(cache_key)
+        if pixels is not None:
+            return pixels
+
+    pix = page.get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False)
+    shape = (pix.h, pix.w) if pix.n == 1 else (pix.h, pix.w, pix.n)
+    pixels = np.frombuffer(pix.samples, dtype=np.uint8).reshape(shape)
+    if cache_key:
+        try:
+            page_render_cache.put(cache_key, pixels)
+        except OSError as e:
+            print(f"Warning: Could not cache page render: {e}")
+    return pixels
+
+
+def get_cached_render(page, dpi: int, colorspace=fitz.csGRAY):
+    """ Returns a cached render of the page if there is one, without rendering on a miss. """
+    cache_key = _render_key(page, dpi, colorspace)
+    return page_render_cache.get(cache_key) if cache_key else None
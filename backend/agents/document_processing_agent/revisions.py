@@ -0,0 +1,49 @@
+import hashlib
+
+# ============================================
+# Page Content Hashes for Revised Documents
+# ============================================
+# Addenda usually re-issue the whole bid package with only a few pages changed. A page's
+# content stream, plus the images and form XObjects it draws, identifies it independently of
+# where it sits in the file, so unchanged pages can be found even when pages were inserted.
+
+
+def page_content_hash(page) -> str:
+    """
+    Returns a SHA-256 over what a page draws: its size and rotation, its content streams, and
+    the raw streams of the images and form XObjects it references. Object numbers are not
+    included, so re-saving or re-ordering the file does not change the hash.
+    """
+    doc = page.parent
+    digest = hashlib.sha256()
+    digest.update(f"{page.rect.width:.2f}x{page.rect.height:.2f}|{page.rotation}|".encode())
+    # Not page.read_contents(): PyMuPDF 1.24 raises on pages without /Contents (e.g. blank pages)
+    for xref in page.get_contents():
+        digest.update(doc.xref_stream(xref) or b"")
+    referenced_xrefs = [image[0] for image in page.get_images()] + [xobject[0] for xobject in page.get_xobjects()]
+    for xref in referenced_xrefs:
+        if xref > 0:
+            digest.update(hashlib.sha256(doc.xref_stream_raw(xref) or b"").digest())
+    return digest.hexdigest()
+
+
+def page_content_hashes(doc) -> list:
+    """ Returns the content hash of every page of an open fitz document, in page order. """
+    return [page_content_hash(doc.load_page(page_num)) for page_num in range(len(doc))]
+
+
+def match_unchanged_pages(previous_hashes: list, current_hashes: list) -> dict:
+    """
+    Pairs each current page with an identical page of the previous revision.
+    Returns {current 0-based page index: previous 0-based page index}; pages missing from the
+    result are new or changed. Duplicate pages are paired in order.
+    """
+    previous_by_hash = {}
+    for page_num, page_hash in enumerate(previous_hashes):
+        previous_by_hash.setdefault(page_hash, []).append(page_num)
+    matches = {}
+    for page_num, page_hash in enumerate(current_hashes):
+        candidates = previous_by_hash.get(page_hash)
+        if candidates:
+            matches[page_num] = candidates.pop(0)
+    return matches
@@ -1,12 +1,17 @@
 import os
 import json
+import hashlib
 import re
 import traceback
+import shutil
+import asyncio
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ProcessPoolExecutor, wait
 import fitz  # PyMuPDF
 import numpy as np
 import cv2
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.documentintelligence import DocumentIntelligenceClient
+from azure.ai.documentintelligence.models import AnalyzeResult
 
 # Add project root to sys.path to allow absolute imports from /backend
 import sys
@@ -15,207 +20,946 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from backend.config import load_config
-from backend.agents.shared_libraries.utils import get_absolute_path, get_output_path
+from backend.agents.shared_libraries import constants
+from backend.agents.shared_libraries.utils import file_sha256, get_absolute_path, get_output_path
+from backend.agents.document_processing_agent.azure_cache import azure_layout_cache
+from backend.agents.document_processing_agent.azure_engine import (
+    ANALYSIS_TIMEOUT_SECONDS, AZURE_LAYOUT_FEATURES, AZURE_LAYOUT_MODEL_ID, AzureAnalysisEngine,
+    get_azure_credentials, get_cache_key, get_document_intelligence_client
+)
+from backend.agents.document_processing_agent.word_index import PageWordIndex
+from backend.agents.document_processing_agent.blueprint import (
+    BLUEPRINT_EXTENSION, SUMMARY_MAX_FIELD_NAMES, CompactBlueprint, corners_to_box
+)
+from backend.agents.document_processing_agent.field_index import (
+    build_field_index, load_field_index, read_field_index, resolve_widget_xrefs, write_field_index
+)
+from backend.agents.document_processing_agent.revisions import match_unchanged_pages, page_content_hashes
+from backend.agents.document_processing_agent.layout_index import layout_index, page_fingerprint
+from backend.agents.document_processing_agent.render_cache import get_cached_render, page_render_cache, render_page
+from backend.agents.document_processing_agent.page_triage import (
+    PAGE_BLANK, PAGE_PROSE, PAGE_SCANNED_FORM, PAGE_VECTOR_FORM, triage_pages
+)
+
+# ============================================
+# Blueprint Artifacts
+# ============================================
+
+def _store_blueprint(file_path: str, form_fields: list, source: str) -> dict:
+    """
+    Saves a blueprint as a compact `.npz` artifact next to the other outputs and returns the
+    summary the tools send to the agent instead of the full field list. The `blueprint_path`
+    is the handle the other tools accept wherever a blueprint path is expected.
+
+    The file name carries the producing tool (`source`) and a short hash of the PDF bytes and
+    the fields, so a later analysis, or another upload with the same file name, never replaces
+    the file behind a handle the agent already holds.
+    """
+    blueprint = CompactBlueprint.from_fields(form_fields)
+    content_hash = hashlib.sha256(file_sha256(get_absolute_path(file_path)).encode())
+    content_hash.update(json.dumps(form_fields, sort_keys=True).encode())
+    blueprint_path = get_output_path(file_path, f"_{source}_blueprint_{content_hash.hexdigest()[:10]}",
+                                     new_extension=BLUEPRINT_EXTENSION)
+    blueprint.save(blueprint_path)
+    return {"blueprint_path": blueprint_path, **blueprint.summary()}
 
 # ============================================
 # Tier 1 Analysis Tool: Azure OCR
 # ============================================
 
-def create_form_field_blueprint_from_azure(file_path: str) -> str:
+AZURE_LABEL_MIN_CONFIDENCE = 0.5  # Words Azure read with less confidence are OCR noise, not labels
+
+def _is_signature_label(names: np.ndarray) -> np.ndarray:
+    """ Mask of label names mentioning a signature; those areas are signed by hand, not filled. """
+    if not len(names):
+        return np.zeros(0, dtype=bool)
+    return np.char.find(np.char.lower(names), "signature") >= 0
+
+def _polygon_bounds(polygons: list) -> np.ndarray:
     """
-    (Primary Tool) Analyzes a document using Azure Document Intelligence to find all
-    words and their coordinates. It saves the raw analysis to a JSON file for debugging and
-    then applies heuristics to identify likely form field labels, creating a JSON "blueprint".
+    Converts flat Azure polygons ([x0, y0, x1, y1, ...]) into an (N, 4) array of min_x, min_y,
+    max_x, max_y in one pass. Polygons of different lengths are padded with NaN; an empty
+    polygon gives an all-NaN row.
     """
-    try:
-        config = load_config()
-        AZURE_DOC_INTEL_ENDPOINT = config.get('AZURE_DOC_INTEL_ENDPOINT')
-        AZURE_DOC_INTEL_KEY = config.get('AZURE_DOC_INTEL_KEY')
+    bounds = np.full((len(polygons), 4), np.nan)
+    if not polygons:
+        return bounds
+    width = max(len(polygon) for polygon in polygons)
+    points = np.full((len(polygons), max(width, 2)), np.nan)
+    for row, polygon in enumerate(polygons):
+        points[row, :len(polygon)] = polygon
+    # Reduce only the non-empty rows: nanmin/nanmax warn on an all-NaN row
+    filled = ~np.isnan(points).all(axis=1)
+    xs, ys = points[filled, 0::2], points[filled, 1::2]
+    bounds[filled] = np.column_stack((np.nanmin(xs, axis=1), np.nanmin(ys, axis=1), np.nanmax(xs, axis=1), np.nanmax(ys, axis=1)))
+    return bounds
+
+def _normalized_fields(names, field_type: str, page_number: int, boxes: np.ndarray, width: float, height: float) -> list:
+    """ Builds public-format fields from names and (N, 4) page-unit boxes, normalized to the page size. """
+    normalized = (boxes / np.array([width, height, width, height])).tolist()
+    return [{
+        # page_number is the 1-based page in the source file, even for page selections
+        "field_name": name, "field_type": field_type, "page_number": page_number,
+        "coordinates": [{"x": x0, "y": y0}, {"x": x1, "y": y0}, {"x": x1, "y": y1}, {"x": x0, "y": y1}],
+    } for name, (x0, y0, x1, y1) in zip(names, normalized)]
+
+def _key_value_regions(result) -> dict:
+    """
+    Groups Azure's key-value pairs by page: {page_number: (key names, key bounds, value bounds)}.
+    A missing value region is NaN, so the label heuristic's box is used for it.
+    """
+    regions = {}
+    for pair in result.key_value_pairs or []:
+        key_regions = pair.key.bounding_regions or []
+        if not key_regions:
+            continue
+        value_regions = (pair.value.bounding_regions or []) if pair.value else []
+        page_regions = regions.setdefault(key_regions[0].page_number, ([], [], []))
+        page_regions[0].append(pair.key.content.strip().replace(":", ""))
+        page_regions[1].append(key_regions[0].polygon)
+        page_regions[2].append(value_regions[0].polygon if value_regions else [])
+    return {page_number: (np.array(names, dtype=str), _polygon_bounds(key_polygons), _polygon_bounds(value_polygons))
+            for page_number, (names, key_polygons, value_polygons) in regions.items()}
 
-        if not AZURE_DOC_INTEL_ENDPOINT or not AZURE_DOC_INTEL_KEY:
-            return '{"error": "Azure Document Intelligence credentials are not configured."}'
+def _fields_from_azure_result(result) -> list:
+    """
+    Turns an Azure AnalyzeResult into form fields with array operations per page:
+    - words ending in ':' are labels, with a field box to their right (the colon-label heuristic)
+    - key-value pairs, when the analysis returned them, replace the colon labels they cover and
+      use the detected value region as the field box
+    - selection marks become checkbox fields named after the nearest word to their right
+    Text and checkbox labels mentioning a signature are skipped.
+    """
+    if not result.pages:
+        raise ValueError("Azure did not return any pages from the document.")
+
+    key_values = _key_value_regions(result)
+    form_fields = []
+    for page in result.pages:
+        # Item access reads the model's raw data; attribute access is far slower on dense pages
+        words = page.words or []
+        contents = np.array([w["content"].strip() for w in words], dtype=str)
+        word_bounds = _polygon_bounds([w["polygon"] for w in words])
+        confidences = np.array([w["confidence"] for w in words], dtype=float)
+        label_names = np.char.replace(contents, ":", "") if len(contents) else contents
+
+        # The colon-label heuristic, as masks over the whole page: the field starts 10 units right of
+        # the label, spans its height plus 5 units each way, and runs to 50 units from the page edge
+        is_label = (np.char.endswith(contents, ":") & (confidences >= AZURE_LABEL_MIN_CONFIDENCE)
+                    if len(contents) else np.zeros(0, dtype=bool))
+        boxes = np.column_stack((word_bounds[:, 2] + 10, word_bounds[:, 1] - 5,
+                                 np.full(len(words), page.width - 50.0), word_bounds[:, 3] + 5))
+
+        if page.page_number in key_values:
+            kv_names, kv_key_bounds, kv_value_bounds = key_values[page.page_number]
+            # A key-value pair replaces any colon label whose center lies inside the pair's key
+            centers_x = (word_bounds[:, 0] + word_bounds[:, 2]) / 2
+            centers_y = (word_bounds[:, 1] + word_bounds[:, 3]) / 2
+            covered = ((centers_x[:, None] >= kv_key_bounds[None, :, 0]) & (centers_x[:, None] <= kv_key_bounds[None, :, 2]) &
+                       (centers_y[:, None] >= kv_key_bounds[None, :, 1]) & (centers_y[:, None] <= kv_key_bounds[None, :, 3]))
+            is_label &= ~covered.any(axis=1)
+            kv_boxes = np.column_stack((kv_key_bounds[:, 2] + 10, kv_key_bounds[:, 1] - 5,
+                                        np.full(len(kv_names), page.width - 50.0), kv_key_bounds[:, 3] + 5))
+            has_value = ~np.isnan(kv_value_bounds).any(axis=1)
+            kv_boxes[has_value] = kv_value_bounds[has_value]
+            label_names = np.concatenate((label_names, kv_names))
+            boxes = np.vstack((boxes, kv_boxes))
+            is_label = np.concatenate((is_label, np.ones(len(kv_names), dtype=bool)))
 
-        absolute_file_path = get_absolute_path(file_path)
-        client = DocumentIntelligenceClient(
-            endpoint=AZURE_DOC_INTEL_ENDPOINT, credential=AzureKeyCredential(AZURE_DOC_INTEL_KEY)
-        )
+        keep = is_label & (boxes[:, 2] > boxes[:, 0]) & ~_is_signature_label(label_names)
+        form_fields += _normalized_fields(label_names[keep].tolist(), "text", page.page_number, boxes[keep], page.width, page.height)
+
+        marks = page.selection_marks or []
+        if marks:
+            mark_bounds = _polygon_bounds([mark["polygon"] for mark in marks])
+            # Nearest word to the right of each mark whose vertical center lies within the mark's height
+            word_centers_y = (word_bounds[:, 1] + word_bounds[:, 3]) / 2
+            gaps = word_bounds[None, :, 0] - mark_bounds[:, None, 2]
+            same_line = ((word_centers_y[None, :] >= mark_bounds[:, None, 1]) &
+                         (word_centers_y[None, :] <= mark_bounds[:, None, 3]) & (gaps >= 0))
+            gaps = np.where(same_line, gaps, np.inf)
+            nearest = gaps.argmin(axis=1) if len(words) else np.zeros(len(marks), dtype=int)
+            has_label = same_line.any(axis=1) if len(words) else np.zeros(len(marks), dtype=bool)
+            mark_names = np.array([label_names[word].strip() if labelled else f"Checkbox {page.page_number}-{i + 1}"
+                                   for i, (word, labelled) in enumerate(zip(nearest.tolist(), has_label.tolist()))], dtype=str)
+            keep_marks = ~_is_signature_label(mark_names)
+            form_fields += _normalized_fields(mark_names[keep_marks].tolist(), "checkbox", page.page_number,
+                                              mark_bounds[keep_marks], page.width, page.height)
+    return form_fields
+
+def _save_raw_azure_output(file_path: str, result) -> str:
+    """ Saves the raw Azure analysis next to the other outputs for debugging and returns its path. """
+    raw_output_path = get_output_path(file_path, "_azure_raw_analysis.json")
+    try:
+        with open(raw_output_path, 'w') as f:
+            json.dump(result.as_dict(), f, indent=2)
+    except Exception as e:
+        print(f"Warning: Could not save raw Azure analysis file: {e}")
+    return raw_output_path
 
+def _analyze_with_azure(file_path: str, pages: str = None) -> tuple:
+    """
+    Runs the Azure "prebuilt-layout" model on the document (optionally restricted to a page
+    selection such as "1-3,7") with the pooled client and applies the label heuristic to the result.
+    Returns (form_fields, raw_output_path). Raises ValueError for problems the agent should see as-is.
+    """
+    absolute_file_path = get_absolute_path(file_path)
+    cache_key = get_cache_key(absolute_file_path, pages)
+    cached_result = azure_layout_cache.get(cache_key) if cache_key else None
+    if cached_result is not None:
+        print(f"[DEBUG-AZURE] Cache hit for '{os.path.basename(file_path)}', skipping the Azure round-trip. {azure_layout_cache.stats()}")
+        result = AnalyzeResult(cached_result)
+    else:
+        client = get_document_intelligence_client()
+        # Stream the file body instead of reading the whole PDF into memory
         with open(absolute_file_path, "rb") as f:
             poller = client.begin_analyze_document(
-                "prebuilt-layout", f.read(), content_type="application/octet-stream"
+                AZURE_LAYOUT_MODEL_ID, f, pages=pages, features=AZURE_LAYOUT_FEATURES,
+                content_type="application/octet-stream"
             )
-        result = poller.result(timeout=600)
-        
-        raw_output_path = get_output_path(file_path, "_azure_raw_analysis.json")
-        try:
-            with open(raw_output_path, 'w') as f:
-                json.dump(result.to_json(), f, indent=2)
-        except Exception as e:
-            print(f"Warning: Could not save raw Azure analysis file: {e}")
-
-        if not result.pages:
-            return '{"error": "Azure did not return any pages from the document."}'
-
-        form_fields = []
-        for page_num, page in enumerate(result.pages):
-            # The rest of this tool is a basic heuristic. The raw output is the most valuable part.
-            potential_labels = [w for w in page.words if w.content.strip().endswith(':')]
-            for label_word in potential_labels:
-                label_text = label_word.content.strip().replace(":", "")
-                if "signature" in label_text.lower(): continue
-                label_poly = label_word.polygon
-                label_x_coords = [label_poly[i] for i in range(0, len(label_poly), 2)]
-                label_y_coords = [label_poly[i+1] for i in range(0, len(label_poly), 2)]
-                
-                field_x0 = max(label_x_coords) + 10
-                field_y0 = min(label_y_coords) - 5
-                field_x1 = page.width - 50
-                field_y1 = max(label_y_coords) + 5
-
-                if field_x1 <= field_x0: continue
-
-                form_fields.append({
-                    "field_name": label_text, "field_type": "text", "page_number": page_num + 1,
-                    "coordinates": [
-                        {"x": field_x0 / page.width, "y": field_y0 / page.height},
-                        {"x": field_x1 / page.width, "y": field_y0 / page.height},
-                        {"x": field_x1 / page.width, "y": field_y1 / page.height},
-                        {"x": field_x0 / page.width, "y": field_y1 / page.height},
-                    ]
-                })
+            result = poller.result(timeout=ANALYSIS_TIMEOUT_SECONDS)
+        if cache_key:
+            try:
+                azure_layout_cache.put(cache_key, result.as_dict())
+            except Exception as e:
+                print(f"Warning: Could not cache Azure analysis result: {e}")
+
+    raw_output_path = _save_raw_azure_output(file_path, result)
+    return _fields_from_azure_result(result), raw_output_path
+
+def create_form_field_blueprint_from_azure(file_path: str) -> str:
+    """
+    (OCR Tool) Analyzes a document using Azure Document Intelligence to find all
+    words and their coordinates. It saves the raw analysis to a JSON file for debugging and
+    then applies heuristics to identify likely form field labels, creating a JSON "blueprint".
+    """
+    try:
+        form_fields, raw_output_path = _analyze_with_azure(file_path)
 
         if not form_fields:
             return f'{{"error": "The Azure-based heuristic analysis did not identify any potential form fields.", "raw_output_path": "{raw_output_path}"}}'
 
-        return json.dumps({"form_fields": form_fields, "raw_output_path": raw_output_path}, indent=2)
+        return json.dumps({**_store_blueprint(file_path, form_fields, "azure"), "raw_output_path": raw_output_path})
 
+    except ValueError as e:
+        return json.dumps({"error": str(e)})
     except Exception as e:
         return f'{{"error": "An error occurred in the Azure blueprint tool: {type(e).__name__} - {str(e)}"}}'
 
+async def create_form_field_blueprints_from_azure_batch(file_paths: list[str]) -> str:
+    """
+    (Batch OCR Tool) Analyzes many documents (e.g. an addendum batch) with Azure Document
+    Intelligence concurrently and returns one blueprint per document. The batch takes about as
+    long as its slowest document. Each entry has either a `blueprint_path` summary or an `error` key.
+    """
+    try:
+        get_azure_credentials()
+        results = await AzureAnalysisEngine().analyze_many(file_paths)
+
+        documents = []
+        for file_path, result in zip(file_paths, results):
+            entry = {"file_path": file_path}
+            if isinstance(result, Exception):
+                entry["error"] = f"{type(result).__name__} - {str(result)}"
+            else:
+                entry["raw_output_path"] = _save_raw_azure_output(file_path, result)
+                try:
+                    form_fields = _fields_from_azure_result(result)
+                    if form_fields:
+                        entry.update(_store_blueprint(file_path, form_fields, "azure"))
+                    else:
+                        entry["error"] = "The Azure-based heuristic analysis did not identify any potential form fields."
+                except ValueError as e:
+                    entry["error"] = str(e)
+            documents.append(entry)
+        return json.dumps({"documents": documents})
+
+    except ValueError as e:
+        return json.dumps({"error": str(e)})
+    except Exception as e:
+        return f'{{"error": "An error occurred in the Azure batch blueprint tool: {type(e).__name__} - {str(e)}"}}'
+
 # ============================================
 # Tier 2 Analysis Tool: Local CV/Text Heuristics
 # ============================================
 
+MERGE_GRID_CELL_SIZE = 50  # PDF points; a few times the typical field height
+
+def _rects_touch(a, b, tolerance: float) -> bool:
+    """ True if two rects overlap or are separated by at most `tolerance` on both axes. """
+    return (a.x0 <= b.x1 + tolerance and b.x0 <= a.x1 + tolerance and
+            a.y0 <= b.y1 + tolerance and b.y0 <= a.y1 + tolerance)
+
+def _merge_connected_rects(rects: list, tolerance: float) -> list:
+    """
+    One merge pass: unions every pair of touching rects and returns the bounding box of each
+    connected component. Rects are bucketed into a uniform grid so only rects that share a
+    cell are compared, and each cell is swept in x order so the comparisons stop early.
+    """
+    parent = list(range(len(rects)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    grid = {}
+    for i, r in enumerate(rects):
+        for cx in range(int((r.x0 - tolerance) // MERGE_GRID_CELL_SIZE), int((r.x1 + tolerance) // MERGE_GRID_CELL_SIZE) + 1):
+            for cy in range(int((r.y0 - tolerance) // MERGE_GRID_CELL_SIZE), int((r.y1 + tolerance) // MERGE_GRID_CELL_SIZE) + 1):
+                grid.setdefault((cx, cy), []).append(i)
+
+    for cell in grid.values():
+        cell.sort(key=lambda i: rects[i].x0)
+        for n, i in enumerate(cell):
+            a = rects[i]
+            for j in cell[n + 1:]:
+                b = rects[j]
+                if b.x0 > a.x1 + tolerance:
+                    break  # Sorted by x0, so no later rect in this cell can touch `a`
+                if _rects_touch(a, b, tolerance):
+                    root_i, root_j = find(i), find(j)
+                    if root_i != root_j:
+                        parent[root_j] = root_i
+
+    # Union coordinates by hand: Rect.include_rect ignores zero-height rects such as detected lines
+    components = {}
+    for i, r in enumerate(rects):
+        root = find(i)
+        if root in components:
+            box = components[root]
+            box[0], box[1], box[2], box[3] = min(box[0], r.x0), min(box[1], r.y0), max(box[2], r.x1), max(box[3], r.y1)
+        else:
+            components[root] = [r.x0, r.y0, r.x1, r.y1]
+    return [fitz.Rect(box) for box in components.values()]
+
 def merge_overlapping_rects(rects: list, tolerance: int = 5) -> list:
-    """ Merges overlapping or very close fitz.Rect objects into larger bounding boxes. """
+    """
+    Merges overlapping or very close (within `tolerance`) fitz.Rect objects into larger bounding
+    boxes. This is a true connected-component union: a rect joins a group if it touches any member,
+    not just the most recent merge. Passes repeat until no merged box touches another one.
+    """
     if not rects: return []
-    sorted_rects = sorted(rects, key=lambda r: (r.y0, r.x0))
-    merged = []
-    current_merge_rect = sorted_rects[0]
-    for i in range(1, len(sorted_rects)):
-        next_rect = sorted_rects[i]
-        expanded_rect = fitz.Rect(current_merge_rect)
-        expanded_rect.x1 += tolerance
-        expanded_rect.y1 += tolerance
-        if expanded_rect.intersects(next_rect):
-            current_merge_rect.include_rect(next_rect)
-        else:
-            merged.append(current_merge_rect)
-            current_merge_rect = next_rect
-    merged.append(current_merge_rect)
-    return merged
+    merged = [fitz.Rect(r) for r in rects]
+    while True:
+        next_merged = _merge_connected_rects(merged, tolerance)
+        if len(next_merged) == len(merged):
+            break
+        merged = next_merged
+    return sorted(merged, key=lambda r: (r.y0, r.x0))
+
+def _filter_horizontal_segments(segments, max_width: float, max_dy: float, table_gap: float,
+                                join_gap: float, min_length: float = 0, window: int = 5) -> np.ndarray:
+    """
+    Batched post-processing for detected line segments, given as an (N, 4) or Hough (N, 1, 4)
+    array of x0, y0, x1, y1. All thresholds are in the segments' own units (pixels or points).
+    1. Keeps horizontal segments (|dy| < max_dy) whose length is in [min_length, max_width).
+    2. Joins collinear pieces that Hough splits one line into: segments whose y differs by at
+       most max_dy / 2 and whose x ranges overlap or are within join_gap become one segment.
+    3. Applies the table rule: drops segments with a neighbour among the `window` nearest in y
+       order on either side that is less than table_gap away vertically.
+    Returns an (M, 4) float array of x0, y, x1, y rows sorted by y.
+    """
+    segs = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+    segs = segs[np.abs(segs[:, 1] - segs[:, 3]) < max_dy]
+    x0 = np.minimum(segs[:, 0], segs[:, 2])
+    x1 = np.maximum(segs[:, 0], segs[:, 2])
+    y = (segs[:, 1] + segs[:, 3]) / 2
+    keep = ((x1 - x0) < max_width) & ((x1 - x0) >= min_length)
+    x0, x1, y = x0[keep], x1[keep], y[keep]
+    if not len(y):
+        return np.empty((0, 4))
 
-def extract_fields_with_local_heuristics(file_path: str) -> str:
+    # Group near-equal y values into rows, then sort each row by x0
+    order = np.argsort(y, kind="stable")
+    x0, x1, y = x0[order], x1[order], y[order]
+    row = np.concatenate(([0], np.cumsum(np.diff(y) > max_dy / 2)))
+    order = np.lexsort((x0, row))
+    x0, x1, y, row = x0[order], x1[order], y[order], row[order]
+
+    # Running max of x1 within each row (rows are offset so they never mix), then start a new
+    # run wherever a segment begins beyond the previous run's reach
+    offset = row * (x1.max() - min(x0.min(), 0) + join_gap + 1)
+    reach = np.maximum.accumulate(x1 + offset)
+    new_run = np.ones(len(y), dtype=bool)
+    new_run[1:] = (row[1:] != row[:-1]) | (x0[1:] + offset[1:] > reach[:-1] + join_gap)
+    starts = np.flatnonzero(new_run)
+    counts = np.diff(np.append(starts, len(y)))
+    x0 = np.minimum.reduceat(x0, starts)
+    x1 = np.maximum.reduceat(x1, starts)
+    y = np.add.reduceat(y, starts) / counts
+
+    # Windowed table rule over the y-sorted, de-duplicated segments
+    order = np.argsort(y, kind="stable")
+    x0, x1, y = x0[order], x1[order], y[order]
+    is_part_of_table = np.zeros(len(y), dtype=bool)
+    for k in range(1, min(window, len(y) - 1) + 1):
+        close = (y[k:] - y[:-k]) < table_gap
+        is_part_of_table[k:] |= close
+        is_part_of_table[:-k] |= close
+    keep = ~is_part_of_table
+    return np.column_stack((x0[keep], y[keep], x1[keep], y[keep]))
+
+RASTER_DPI = 300  # Resolution the Hough parameters were tuned for, and the precision of line coordinates
+
+def _hough_horizontal_lines(img_data: np.ndarray, dpi: int):
+    """ Runs HoughLinesP on a grayscale render, scaling the 300 DPI-tuned parameters to `dpi`. """
+    scale = dpi / RASTER_DPI
+    inverted_img = cv2.bitwise_not(img_data)
+    # Loosened restrictions to find more potential lines
+    return cv2.HoughLinesP(inverted_img, rho=1, theta=np.pi/180, threshold=max(1, round(100 * scale)),
+                           minLineLength=round(50 * scale), maxLineGap=max(1, round(10 * scale)))
+
+def _refine_line_rect(page, rect, full_render: np.ndarray = None):
     """
-    (Fallback Tool) Analyzes a PDF using a high-speed, hybrid approach. It uses computer
-    vision (OpenCV) to detect lines and combines this with a text search for underscores.
-    This is the fallback if Azure OCR fails to find fields.
+    Re-renders only a small clip around a line found at low resolution, at full RASTER_DPI, and
+    returns the precise line rect in PDF points, or None if the clip has no line: at low
+    resolution text baselines and dense rows of glyphs can blur into line-like candidates.
+    If a cached full-resolution render of the page is passed, the clip is sliced from it instead.
     """
+    clip = fitz.Rect(rect.x0 - 6, rect.y0 - 6, rect.x1 + 6, rect.y1 + 6) & page.rect
+    if full_render is not None:
+        irect = (clip * RASTER_DPI / 72).irect
+        origin_x, origin_y = irect.x0, irect.y0
+        img_data = full_render[irect.y0:irect.y1, irect.x0:irect.x1]
+    else:
+        pix = page.get_pixmap(dpi=RASTER_DPI, colorspace=fitz.csGRAY, alpha=False, clip=clip)
+        origin_x, origin_y = pix.x, pix.y
+        img_data = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.h, pix.w)
+    lines = _hough_horizontal_lines(img_data, RASTER_DPI)
+    if lines is None:
+        return None
+    # table_gap=0 disables the table rule: every line here belongs to the same candidate
+    segments = _filter_horizontal_segments(lines, max_width=float("inf"), max_dy=20, table_gap=0, join_gap=10)
+    if not len(segments):
+        return None
+    x0, y, x1, _ = segments[np.argmax(segments[:, 2] - segments[:, 0])]
+    # Clip pixels are relative to the clip's top-left corner at RASTER_DPI
+    return fitz.Rect(origin_x + x0, origin_y + y, origin_x + x1, origin_y + y) / RASTER_DPI * 72
+
+def _detect_raster_line_rects(page, page_num: int, detect_dpi: int = 0) -> list:
+    """
+    Raster engine: renders the page and finds horizontal lines with OpenCV. Used for scanned
+    pages whose lines only exist as pixels. Returns line rects in PDF points.
+
+    With a `detect_dpi` below RASTER_DPI (0 uses the RASTER_DETECT_DPI setting), lines are found
+    on a cheap low-resolution render and only small clips around them are re-rendered at full
+    resolution for precise coordinates; candidates the full-resolution clip does not confirm
+    are dropped.
+
+    Renders go through the page render cache, so re-running on the same PDF maps the cached
+    bitmap instead of rasterizing the page again.
+    """
+    detect_dpi = detect_dpi or constants.RASTER_DETECT_DPI
+    scale = detect_dpi / RASTER_DPI
+    img_data = render_page(page, detect_dpi)
+    lines = _hough_horizontal_lines(img_data, detect_dpi)
+    page_width_px = img_data.shape[1]
+    del img_data  # Release the page buffer before any high-resolution clips are rendered
+
+    if lines is None:
+        print(f"[DEBUG-VISION] Page {page_num + 1}: Found 0 lines via computer vision at {detect_dpi} DPI.")
+        return []
+
+    print(f"[DEBUG-VISION] Page {page_num + 1}: Found {len(lines)} total lines via computer vision at {detect_dpi} DPI.")
+    isolated_lines = _filter_horizontal_segments(lines, max_width=page_width_px * 0.9, max_dy=20 * scale,
+                                                 table_gap=30 * scale, join_gap=10 * scale)
+    print(f"[DEBUG-VISION] Page {page_num + 1}: Filtered to {len(isolated_lines)} isolated, de-duplicated horizontal lines (table rule).")
+    line_rects = [fitz.Rect(*line) / detect_dpi * 72 for line in isolated_lines]
+    if detect_dpi < RASTER_DPI and line_rects:
+        full_render = get_cached_render(page, RASTER_DPI)
+        refined_rects = (_refine_line_rect(page, rect, full_render) for rect in line_rects)
+        line_rects = [rect for rect in refined_rects if rect is not None]
+    return line_rects
+
+def _detect_vector_line_rects(page, page_num: int, drawings: list, word_index: PageWordIndex) -> list:
+    """
+    Vector engine for born-digital pages: pulls horizontal rules and input boxes straight from
+    the content stream via `page.get_drawings()`, so nothing is rasterized. The thresholds
+    mirror the raster engine, converted from 300 DPI pixels to PDF points.
+    """
+    PT_PER_PX = 72 / 300
+    MIN_RULE_LENGTH = 50 * PT_PER_PX  # minLineLength of the raster engine
+    MIN_BOX_HEIGHT, MAX_BOX_HEIGHT = 8, 40
+    max_width = page.rect.width * 0.9
+
+    segments, boxes = [], []
+    for path in drawings:
+        items = path["items"]
+        path_rect = fitz.Rect(path["rect"])
+        # Boxes drawn as a closed run of straight segments rather than a single 're' operator
+        if (len(items) >= 4 and all(item[0] == "l" for item in items)
+                and MIN_BOX_HEIGHT <= path_rect.height <= MAX_BOX_HEIGHT and path_rect.width >= MIN_RULE_LENGTH):
+            boxes.append(path_rect)
+            continue
+        for item in items:
+            if item[0] == "l":
+                segments.append((item[1].x, item[1].y, item[2].x, item[2].y))
+            elif item[0] in ("re", "qu"):
+                rect = fitz.Rect(item[1]) if item[0] == "re" else item[1].rect
+                if MIN_BOX_HEIGHT <= rect.height <= MAX_BOX_HEIGHT and rect.width >= MIN_RULE_LENGTH:
+                    boxes.append(rect)
+                else:
+                    # Thin filled rectangles are how many generators draw underlines
+                    segments.append((rect.x0, rect.y0, rect.x1, rect.y1))
+
+    # Boxes that already contain text are label or table cells, not blanks to fill in
+    boxes = [b for b in boxes if b.width < max_width and not any(
+        b.contains(fitz.Point((w[0] + w[2]) / 2, (w[1] + w[3]) / 2)) for w in word_index.query(b))]
+    rules = _filter_horizontal_segments(segments, max_width=max_width, max_dy=20 * PT_PER_PX, table_gap=30 * PT_PER_PX,
+                                        join_gap=10 * PT_PER_PX, min_length=MIN_RULE_LENGTH)
+    # Drop rules that are just the edges of a detected box
+    isolated_rules = [fitz.Rect(*rule) for rule in rules]
+    isolated_rules = [r for r in isolated_rules if not any(fitz.Rect(b.x0 - 2, b.y0 - 2, b.x1 + 2, b.y1 + 2).contains(r) for b in boxes)]
+    print(f"[DEBUG-VISION] Page {page_num + 1}: Found {len(isolated_rules)} isolated horizontal rules and {len(boxes)} boxes via vector drawings.")
+    return isolated_rules + boxes
+
+# Detected rules are zero-height lines; anything flatter than this is given a text row's height
+MIN_FIELD_HEIGHT = 4
+DEFAULT_ROW_HEIGHT = 12  # Row height for pages without text to measure (scans)
+
+def _field_rect(rect, row_height: float):
+    """
+    Returns the fillable area for a candidate field. Boxes and underscore runs are used as they
+    are; a drawn rule becomes the text row sitting on it, extended upward by `row_height`.
+    """
+    if rect.height >= MIN_FIELD_HEIGHT:
+        return rect
+    return fitz.Rect(rect.x0, rect.y1 - row_height, rect.x1, rect.y1)
+
+def _extract_page_fields(page, page_num: int, page_count: int, engine: str = "auto") -> list:
+    """ Runs the CV/text heuristics on a single page and returns the form fields found on it. """
+    page_fields = []
+    print(f"--- [DEBUG-VISION] Processing Page {page_num + 1}/{page_count} ---")
+
+    # Parse the page's text once; the sparse check, underscore search and label lookups all share it
+    textpage = page.get_textpage()
+    if len(page.get_text(textpage=textpage)) < 50 and not page.get_images():
+        print(f"[DEBUG-VISION] Page {page_num + 1} is sparse, skipping.")
+        return page_fields
+
+    word_index = PageWordIndex(page.get_text("words", textpage=textpage))
+    drawings = page.get_drawings() if engine != "raster" else []
+    # Only scanned pages (images without any vector drawings) need to be rasterized
+    if engine == "raster" or (engine == "auto" and not drawings and page.get_images()):
+        page_line_rects = _detect_raster_line_rects(page, page_num)
+    else:
+        page_line_rects = _detect_vector_line_rects(page, page_num, drawings, word_index)
+
+    # Find all words with at least one underscore
+    page_underscore_rects = [fitz.Rect(word[:4]) for word in word_index.containing("_")]
+    print(f"[DEBUG-VISION] Page {page_num + 1}: Found {len(page_underscore_rects)} underscore fields via text search.")
+
+    all_page_rects = page_line_rects + page_underscore_rects
+    merged_rects = merge_overlapping_rects(all_page_rects)
+    print(f"[DEBUG-VISION] Page {page_num + 1}: Found {len(merged_rects)} total potential fields after merging.")
+    row_height = max(word_index.typical_height(DEFAULT_ROW_HEIGHT), MIN_FIELD_HEIGHT)
+
+    for i, rect in enumerate(merged_rects):
+        # Expand search area for labels: 300px left, 15px up/down
+        label_rect = fitz.Rect(rect.x0 - 300, rect.y0 - 15, rect.x0 - 5, rect.y1 + 15)
+        # Get all words in the potential label area
+        words_in_label_area = word_index.query(label_rect)
+        # Sort words from top-to-bottom, then left-to-right to reconstruct reading order
+        words_in_label_area.sort(key=lambda w: (w[1], w[0]))
+
+        # Join words to form a candidate label string, cleaning it up
+        field_name = " ".join([w[4] for w in words_in_label_area]).strip(": \n\t")
+        field_name = re.sub(r'\s*\n\s*', ' ', field_name).strip()
+
+        # If no text label is found, create a unique placeholder name
+        if not field_name:
+            field_name = f"Unnamed Field {page_num + 1}-{i+1}"
+
+        # Skip common non-fields
+        if "signature" in field_name.lower(): continue
+
+        # The label is looked up around the rule itself; the field gets the row above it
+        rect = _field_rect(rect, row_height)
+        page_fields.append({
+            "field_name": field_name, "field_type": "text", "is_required": False, "page_number": page_num + 1,
+            "coordinates": [
+                {"x": rect.x0/page.rect.width, "y": rect.y0/page.rect.height}, {"x": rect.x1/page.rect.width, "y": rect.y0/page.rect.height},
+                {"x": rect.x1/page.rect.width, "y": rect.y1/page.rect.height}, {"x": rect.x0/page.rect.width, "y": rect.y1/page.rect.height}
+            ]
+        })
+    return page_fields
+
+def _iter_page_fields(doc, page_numbers: list, engine: str = "auto", cancel_event=None, release_resources: bool = False):
+    """
+    Yields (page_num, fields) one page at a time. Each page object is dropped before the next
+    one is loaded; with `release_resources` MuPDF's resource store (fonts, images, decoded
+    streams) is emptied after every page too, so memory stays flat regardless of page count.
+    If `cancel_event` (a threading.Event) is set, raises CancelledError before the next page.
+    """
+    page_count = len(doc)
+    for page_num in page_numbers:
+        if cancel_event is not None and cancel_event.is_set():
+            print(f"[DEBUG-VISION] Local analysis of '{doc.name}' was cancelled.")
+            raise CancelledError()
+        page = doc.load_page(page_num)
+        page_fields = _extract_page_fields(page, page_num, page_count, engine)
+        page = None
+        if release_resources:
+            fitz.TOOLS.store_shrink(100)
+        yield page_num, page_fields
+
+def iter_local_heuristic_fields(file_path: str, page_numbers: list = None, engine: str = "auto"):
+    """
+    Streaming form of the local heuristics: yields form fields page by page while holding only
+    one page in memory. The document is closed when the generator is exhausted or closed.
+    """
+    doc = fitz.open(get_absolute_path(file_path))
     try:
-        doc = fitz.open(get_absolute_path(file_path))
-        all_form_fields = []
-        DPI = 300
-        print(f"[DEBUG-VISION] Document '{os.path.basename(file_path)}' has {len(doc)} pages.")
-
-        for page_num, page in enumerate(doc):
-            print(f"--- [DEBUG-VISION] Processing Page {page_num + 1}/{len(doc)} ---")
-            
-            if len(page.get_text()) < 50 and not page.get_images():
-                print(f"[DEBUG-VISION] Page {page_num + 1} is sparse, skipping.")
-                continue
-
-            pix = page.get_pixmap(dpi=DPI, colorspace=fitz.csGRAY, alpha=False)
-            img_data = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.h, pix.w)
-            inverted_img = cv2.bitwise_not(img_data)
-            # Loosened restrictions to find more potential lines
-            lines = cv2.HoughLinesP(inverted_img, rho=1, theta=np.pi/180, threshold=100, minLineLength=50, maxLineGap=10)
-            
-            page_line_rects = []
-            if lines is not None:
-                print(f"[DEBUG-VISION] Page {page_num + 1}: Found {len(lines)} total lines via computer vision.")
-                # Existing filtering logic for horizontal lines etc.
-                horizontal_lines = lines[np.abs(lines[:, 0, 1] - lines[:, 0, 3]) < 20]
-                
-                final_lines = []
-                if horizontal_lines is not None:
-                    for line in horizontal_lines:
-                        if abs(line[0][2] - line[0][0]) < (pix.w * 0.9):
-                            final_lines.append(line)
-                print(f"[DEBUG-VISION] Page {page_num + 1}: Filtered to {len(final_lines)} horizontal, non-border lines.")
-
-                final_lines.sort(key=lambda l: l[0][1])
-                isolated_lines = []
-                if len(final_lines) > 0:
-                    for i, line in enumerate(final_lines):
-                        is_part_of_table = any(abs(line[0][1] - final_lines[j][0][1]) < 30 for j in range(max(0, i-5), min(len(final_lines), i+6)) if i != j)
-                        if not is_part_of_table:
-                            isolated_lines.append(line)
-                print(f"[DEBUG-VISION] Page {page_num + 1}: Filtered to {len(isolated_lines)} isolated lines (table rule).")
-
-                # Add robustness against geometry errors from the vision model
-                for line in isolated_lines:
-                    try:
-                        rect = fitz.Rect(line[0][:4]) / DPI * 72
-                        page_line_rects.append(rect)
-                    except Exception as e:
-                        print(f"[DEBUG-VISION] Warning: Skipping a problematic line from vision analysis. Line: {line}, Error: {e}")
-            else:
-                print(f"[DEBUG-VISION] Page {page_num + 1}: Found 0 lines via computer vision.")
-
-            # Find all words with at least one underscore
-            page_underscore_rects = [fitz.Rect(word[:4]) for word in page.get_text("words") if "_" in word[4]]
-            print(f"[DEBUG-VISION] Page {page_num + 1}: Found {len(page_underscore_rects)} underscore fields via text search.")
-
-            all_page_rects = page_line_rects + page_underscore_rects
-            merged_rects = merge_overlapping_rects(all_page_rects)
-            print(f"[DEBUG-VISION] Page {page_num + 1}: Found {len(merged_rects)} total potential fields after merging.")
-
-            for i, rect in enumerate(merged_rects):
-                # Expand search area for labels: 300px left, 15px up/down
-                label_rect = fitz.Rect(rect.x0 - 300, rect.y0 - 15, rect.x0 - 5, rect.y1 + 15)
-                # Get all words in the potential label area
-                words_in_label_area = page.get_text("words", clip=label_rect)
-                # Sort words from top-to-bottom, then left-to-right to reconstruct reading order
-                words_in_label_area.sort(key=lambda w: (w[1], w[0]))
-                
-                # Join words to form a candidate label string, cleaning it up
-                field_name = " ".join([w[4] for w in words_in_label_area]).strip(": \n\t")
-                field_name = re.sub(r'\s*\n\s*', ' ', field_name).strip()
-
-                # If no text label is found, create a unique placeholder name
-                if not field_name:
-                    field_name = f"Unnamed Field {page_num + 1}-{i+1}"
-                
-                # Skip common non-fields
-                if "signature" in field_name.lower(): continue
-
-                all_form_fields.append({
-                    "field_name": field_name, "field_type": "text", "is_required": False, "page_number": page_num + 1,
-                    "coordinates": [
-                        {"x": rect.x0/page.rect.width, "y": rect.y0/page.rect.height}, {"x": rect.x1/page.rect.width, "y": rect.y0/page.rect.height},
-                        {"x": rect.x1/page.rect.width, "y": rect.y1/page.rect.height}, {"x": rect.x0/page.rect.width, "y": rect.y1/page.rect.height}
-                    ]
-                })
-        
+        if page_numbers is None:
+            page_numbers = range(len(doc))
+        for _, page_fields in _iter_page_fields(doc, page_numbers, engine, release_resources=True):
+            yield from page_fields
+    finally:
+        doc.close()
+
+def _extract_fields_from_page_range(file_path: str, page_numbers: list, engine: str = "auto") -> list:
+    """
+    Process-pool worker for the page-parallel mode. Each worker opens its own handle on the
+    PDF (fitz documents cannot be shared across processes) and analyzes only its slice of pages.
+    Returns a list of (page_num, fields) tuples so the parent can merge them in page order.
+    """
+    doc = fitz.open(get_absolute_path(file_path))
+    try:
+        return list(_iter_page_fields(doc, page_numbers, engine))
+    finally:
+        doc.close()
+
+def _extract_local_fields(file_path: str, page_numbers: list = None, max_workers: int = 0, engine: str = "auto", cancel_event=None) -> list:
+    """
+    Runs the local heuristics on the given 0-based pages (all pages when None) and returns
+    the form fields in page order, using a process pool when `max_workers` is greater than 1.
+    If `cancel_event` (a threading.Event) is set, the analysis stops between pages/chunks
+    and raises CancelledError.
+    """
+    if engine not in ("auto", "vector", "raster"):
+        raise ValueError(f"Unknown engine '{engine}'. Use 'auto', 'vector' or 'raster'.")
+    if max_workers <= 0:
+        max_workers = constants.LOCAL_HEURISTICS_WORKERS
+
+    with fitz.open(get_absolute_path(file_path)) as doc:
+        page_count = len(doc)
+        if page_numbers is None:
+            page_numbers = list(range(page_count))
+        print(f"[DEBUG-VISION] Document '{os.path.basename(file_path)}' has {page_count} pages, analyzing {len(page_numbers)}.")
+        if max_workers <= 1 or len(page_numbers) <= 1:
+            page_results = list(_iter_page_fields(doc, page_numbers, engine, cancel_event))
+
+    if max_workers > 1 and len(page_numbers) > 1:
+        max_workers = min(max_workers, len(page_numbers))
+        # Several small contiguous chunks per worker keep the pool balanced when
+        # expensive form pages are clustered together in the package.
+        chunk_size = max(1, -(-len(page_numbers) // (max_workers * 4)))
+        chunks = [page_numbers[start:start + chunk_size] for start in range(0, len(page_numbers), chunk_size)]
+        print(f"[DEBUG-VISION] Analyzing {len(page_numbers)} pages in {len(chunks)} chunks across {max_workers} worker processes.")
+        page_results = []
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+        try:
+            for chunk_result in executor.map(_extract_fields_from_page_range, [file_path] * len(chunks), chunks, [engine] * len(chunks)):
+                if cancel_event is not None and cancel_event.is_set():
+                    print(f"[DEBUG-VISION] Local analysis of '{os.path.basename(file_path)}' was cancelled.")
+                    raise CancelledError()
+                page_results.extend(chunk_result)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        page_results.sort(key=lambda result: result[0])
+
+    return [field for _, page_fields in page_results for field in page_fields]
+
+def extract_fields_with_local_heuristics(file_path: str, max_workers: int = 0, engine: str = "auto") -> str:
+    """
+    (Fallback Tool) Analyzes a PDF using a high-speed, hybrid approach. It detects lines and
+    boxes and combines them with a text search for underscores. This is the fallback if Azure
+    OCR fails to find fields.
+
+    `engine` selects the line detector: "vector" reads rules and boxes from the PDF drawings,
+    "raster" renders the page and uses computer vision (OpenCV), and "auto" (default) uses the
+    vector engine except on scanned pages that contain only images.
+
+    Pages are analyzed in parallel worker processes when `max_workers` is greater than 1;
+    0 uses the LOCAL_HEURISTICS_WORKERS setting. The output is identical to the serial path.
+    """
+    try:
+        all_form_fields = _extract_local_fields(file_path, max_workers=max_workers, engine=engine)
+
         if not all_form_fields: return '{"error": "No form fields were found using local heuristics."}'
         # Do not remove duplicates, return all found fields
-        return json.dumps({"form_fields": all_form_fields}, indent=2)
+        return json.dumps(_store_blueprint(file_path, all_form_fields, "local"))
 
+    except ValueError as e:
+        return json.dumps({"error": str(e)})
     except Exception as e:
         error_message = f'{{"error": "An error occurred in local heuristics: {type(e).__name__} - {str(e)}"}}'
         print(f"[DEBUG-VISION] Exception during analysis: {error_message}")
         return error_message
 
+def extract_fields_with_local_heuristics_to_jsonl(file_path: str, engine: str = "auto") -> str:
+    """
+    (Streaming Tool) Runs the local heuristics page by page and appends each page's fields to a
+    JSON Lines blueprint file (one field per line) as soon as that page is done, so memory stays
+    flat even for packages with hundreds of pages. The returned `blueprint_path` can be passed to
+    `create_fields_from_blueprint` directly.
+    """
+    try:
+        # Same PDF and engine give the same fields, so the PDF hash alone keeps the handle stable
+        pdf_hash = file_sha256(get_absolute_path(file_path))[:10]
+        output_path = get_output_path(file_path, f"_local_{engine}_blueprint_{pdf_hash}", new_extension="jsonl")
+        field_count = 0
+        pages_with_fields = set()
+        field_names = {}  # Distinct names in first-seen order, like CompactBlueprint.summary
+        with open(output_path, "w") as f:
+            for field in iter_local_heuristic_fields(file_path, engine=engine):
+                f.write(json.dumps(field) + "\n")
+                field_count += 1
+                pages_with_fields.add(field["page_number"])
+                field_names.setdefault(field["field_name"])
+        if not field_count:
+            return '{"error": "No form fields were found using local heuristics."}'
+        response = {"success": True, "blueprint_path": output_path, "field_count": field_count,
+                    "field_names": list(field_names)[:SUMMARY_MAX_FIELD_NAMES],
+                    "pages_with_fields": sorted(pages_with_fields)}
+        if len(field_names) > SUMMARY_MAX_FIELD_NAMES:
+            response["field_names_truncated"] = True
+        return json.dumps(response)
+    except Exception as e:
+        error_message = f'{{"error": "An error occurred in streaming local heuristics: {type(e).__name__} - {str(e)}"}}'
+        print(f"[DEBUG-VISION] Exception during analysis: {error_message}")
+        return error_message
+
+# ============================================
+# Combined Analysis: Race Azure and Local Tiers
+# ============================================
+
+BLUEPRINT_POLICIES = ("prefer_azure", "prefer_local", "first_valid")
+# Azure analyses that lost a race but were left running so their (already billed) result gets cached
+_background_azure_tasks = set()
+
+async def create_form_field_blueprint(file_path: str, policy: str = "") -> str:
+    """
+    (Combined Analysis Tool) Starts the Azure OCR tier and the local heuristics tier at the same
+    time and returns the preferred valid blueprint, so the worst case costs the slower tier
+    instead of both tiers in sequence. `policy` decides the winner:
+    - "prefer_azure": use Azure's blueprint if it is valid, otherwise the local one
+    - "prefer_local": use the local blueprint if it is valid, otherwise Azure's
+    - "first_valid": use whichever tier first returns a valid blueprint
+    Empty uses the BLUEPRINT_POLICY setting. The losing local analysis is cancelled; a losing
+    Azure analysis is allowed to finish in the background so its result lands in the cache.
+    """
+    policy = policy or constants.BLUEPRINT_POLICY
+    if policy not in BLUEPRINT_POLICIES:
+        return json.dumps({"error": f"Unknown policy '{policy}'. Use one of: {', '.join(BLUEPRINT_POLICIES)}."})
+
+    cancel_local = threading.Event()
+    tier_errors = {}
+    started_at = time.monotonic()
+
+    async def run_azure():
+        get_azure_credentials()
+        result = await AzureAnalysisEngine().analyze(file_path)
+        raw_output_path = await asyncio.to_thread(_save_raw_azure_output, file_path, result)
+        print(f"[DEBUG-BLUEPRINT] Azure tier finished after {time.monotonic() - started_at:.1f}s.")
+        return _fields_from_azure_result(result), raw_output_path
+
+    async def run_local():
+        fields = await asyncio.to_thread(_extract_local_fields, file_path, None, 0, "auto", cancel_local)
+        print(f"[DEBUG-BLUEPRINT] Local tier finished after {time.monotonic() - started_at:.1f}s.")
+        return fields, None
+
+    tasks = {"azure": asyncio.create_task(run_azure()), "local": asyncio.create_task(run_local())}
+    preference = ["local", "azure"] if policy == "prefer_local" else ["azure", "local"]
+    outcomes = {}
+
+    def record(tier, task):
+        try:
+            fields, raw_output_path = task.result()
+            if not fields:
+                tier_errors[tier] = "No form fields were found."
+            outcomes[tier] = (fields, raw_output_path)
+        except (CancelledError, asyncio.CancelledError):
+            tier_errors[tier] = "Cancelled."
+        except Exception as e:
+            tier_errors[tier] = f"{type(e).__name__} - {str(e)}"
+
+    winner = None
+    pending = set(tasks.values())
+    while pending and winner is None:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for tier, task in tasks.items():
+            if task in done:
+                record(tier, task)
+        valid = [tier for tier in preference if outcomes.get(tier, (None,))[0]]
+        if policy == "first_valid" and valid:
+            winner = valid[0]
+        elif valid and valid[0] == preference[0]:
+            # The preferred tier produced a valid blueprint; no need to wait for the other one
+            winner = valid[0]
+        elif not pending and valid:
+            winner = valid[0]
+
+    # Stop the loser: local analysis can be cancelled, Azure has already been billed so cache it
+    cancel_local.set()
+    if not tasks["azure"].done():
+        _background_azure_tasks.add(tasks["azure"])
+        tasks["azure"].add_done_callback(_background_azure_tasks.discard)
+    for task in tasks.values():
+        # Retrieve late failures so they are not reported as unhandled
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    if winner is None:
+        return json.dumps({"error": "Neither the Azure nor the local analysis identified any form fields.", "tier_errors": tier_errors})
+
+    form_fields, raw_output_path = outcomes[winner]
+    response = {**_store_blueprint(file_path, form_fields, winner), "source": winner, "policy": policy}
+    if raw_output_path:
+        response["raw_output_path"] = raw_output_path
+    if tier_errors:
+        response["tier_errors"] = tier_errors
+    print(f"[DEBUG-BLUEPRINT] Using the {winner} blueprint ({len(form_fields)} fields) after {time.monotonic() - started_at:.1f}s.")
+    return json.dumps(response)
+
+# ============================================
+# Page Triage: Route Each Page to the Cheapest Tier
+# ============================================
+
+def _format_page_selection(page_numbers: list) -> str:
+    """ Formats 0-based page indexes as an Azure page selection string, e.g. [0, 1, 2, 6] -> "1-3,7". """
+    ranges = []
+    for page_num in sorted(page_numbers):
+        if ranges and page_num == ranges[-1][1] + 1:
+            ranges[-1][1] = page_num
+        else:
+            ranges.append([page_num, page_num])
+    return ",".join(f"{start + 1}" if start == end else f"{start + 1}-{end + 1}" for start, end in ranges)
+
+def _fingerprint_pages(doc, triage: dict) -> dict:
+    """
+    Returns {page_num: layout fingerprint} for every page that triage did not mark blank, or
+    an empty dict when the layout index has nothing to match against.
+    """
+    if not layout_index.stats()["layouts"]:
+        return {}
+    page_numbers = sorted(p for page_class, pages in triage.items() if page_class != PAGE_BLANK for p in pages)
+    return {page_num: page_fingerprint(doc.load_page(page_num)) for page_num in page_numbers}
+
+def _analyze_pages_with_triage(file_path: str, page_numbers: list = None, max_workers: int = 0) -> tuple:
+    """
+    Triages the given pages (default: all) and analyzes each class with its tier, reusing
+    stored fields for known layouts. Returns (form_fields, response) where `response` holds
+    the triage summary and any Azure error or raw output path.
+    """
+    with fitz.open(get_absolute_path(file_path)) as doc:
+        triage = triage_pages(doc, page_numbers)
+        fingerprints = _fingerprint_pages(doc, triage) if constants.LAYOUT_INDEX_ENABLED else {}
+    print(f"[DEBUG-TRIAGE] Page classes for '{os.path.basename(file_path)}': { {k: len(v) for k, v in triage.items()} }")
+
+    # Pages whose layout is already known reuse the stored fields and skip analysis entirely
+    form_fields = []
+    reused_pages = []
+    for page_num, fingerprint in fingerprints.items():
+        known_fields = layout_index.fields_for_page(fingerprint, page_num + 1)
+        if known_fields is not None:
+            form_fields += known_fields
+            reused_pages.append(page_num)
+    reused_page_set = set(reused_pages)
+    to_analyze = {page_class: [p for p in pages if p not in reused_page_set] for page_class, pages in triage.items()}
+    if reused_pages:
+        print(f"[DEBUG-TRIAGE] Reusing stored blueprints for {len(reused_pages)} pages with known layouts.")
+
+    if to_analyze[PAGE_VECTOR_FORM]:
+        form_fields += _extract_local_fields(file_path, to_analyze[PAGE_VECTOR_FORM], max_workers, engine="vector")
+    if to_analyze[PAGE_SCANNED_FORM]:
+        form_fields += _extract_local_fields(file_path, to_analyze[PAGE_SCANNED_FORM], max_workers, engine="raster")
+
+    response = {}
+    if to_analyze[PAGE_PROSE]:
+        try:
+            azure_fields, response["raw_output_path"] = _analyze_with_azure(file_path, _format_page_selection(to_analyze[PAGE_PROSE]))
+            form_fields += azure_fields
+        except Exception as e:
+            # The local tiers' results are still useful; surface the Azure failure alongside them
+            print(f"[DEBUG-TRIAGE] Azure analysis of prose pages failed: {type(e).__name__} - {e}")
+            response["azure_error"] = f"{type(e).__name__} - {str(e)}"
+
+    response["page_triage"] = {page_class: [page_num + 1 for page_num in pages] for page_class, pages in triage.items()}
+    response["reused_layout_pages"] = sorted(page_num + 1 for page_num in reused_pages)
+    return form_fields, response
+
+def analyze_document_with_page_triage(file_path: str, max_workers: int = 0) -> str:
+    """
+    (Primary Tool) Classifies every page as blank/boilerplate, vector form, scanned form or
+    prose and sends each class to the cheapest tier that can handle it: blank pages are
+    skipped, vector forms use the vector engine, scanned forms use OpenCV, and only prose
+    pages are sent to Azure. Returns a merged JSON blueprint plus the per-page triage.
+
+    Pages whose layout fingerprint matches a known form (W-9s, bid bonds, recurring cover
+    sheets) reuse the stored fields without any analysis. Layouts are only added to the index
+    by `save_blueprint_layouts`, once the user has accepted a blueprint, never from raw
+    heuristic output.
+    """
+    try:
+        form_fields, response = _analyze_pages_with_triage(file_path, max_workers=max_workers)
+        if not form_fields:
+            response["error"] = "No form fields were found on any triaged page."
+            return json.dumps(response)
+
+        form_fields.sort(key=lambda field: field["page_number"])
+        return json.dumps({**_store_blueprint(file_path, form_fields, "triage"), **response})
+
+    except Exception as e:
+        return f'{{"error": "An error occurred during page triage analysis: {type(e).__name__} - {str(e)}"}}'
+
+# ============================================
+# Incremental Re-Analysis of Revised Documents
+# ============================================
+
+def analyze_revised_document(file_path: str, previous_file_path: str, previous_blueprint_path: str, max_workers: int = 0) -> str:
+    """
+    (Addendum Tool) Re-analyzes a revised bid document against its previous revision. Pages are
+    compared by content hash: fields of unchanged pages are carried forward from the previous
+    blueprint (re-numbered if pages moved), and only changed or new pages go through the page
+    triage analysis. Returns a merged JSON blueprint plus which pages were carried forward.
+    """
+    try:
+        with fitz.open(get_absolute_path(previous_file_path)) as previous_doc:
+            previous_hashes = page_content_hashes(previous_doc)
+        with fitz.open(get_absolute_path(file_path)) as doc:
+            current_hashes = page_content_hashes(doc)
+        unchanged = match_unchanged_pages(previous_hashes, current_hashes)
+        changed_pages = [page_num for page_num in range(len(current_hashes)) if page_num not in unchanged]
+        print(f"[DEBUG-TRIAGE] Revision of '{os.path.basename(file_path)}': {len(unchanged)} unchanged pages, "
+              f"{len(changed_pages)} changed or new pages.")
+
+        previous_fields_by_page = {}
+        for field in _iter_blueprint_fields(previous_blueprint_path):
+            previous_fields_by_page.setdefault(field.get("page_number", 1) - 1, []).append(field)
+        form_fields = [{**field, "page_number": page_num + 1}
+                       for page_num, previous_page_num in unchanged.items()
+                       for field in previous_fields_by_page.get(previous_page_num, [])]
+
+        response = {}
+        if changed_pages:
+            changed_fields, response = _analyze_pages_with_triage(file_path, changed_pages, max_workers)
+            form_fields += changed_fields
+        response["carried_forward_pages"] = sorted(page_num + 1 for page_num in unchanged)
+        response["reanalyzed_pages"] = [page_num + 1 for page_num in changed_pages]
+        response["unmatched_previous_pages"] = sorted(set(range(1, len(previous_hashes) + 1)) -
+                                                    {previous_page_num + 1 for previous_page_num in unchanged.values()})
+        if not form_fields:
+            response["error"] = "No form fields were found in the revised document."
+            return json.dumps(response)
+
+        form_fields.sort(key=lambda field: field["page_number"])
+        return json.dumps({**_store_blueprint(file_path, form_fields, "revised"), **response})
+
+    except Exception as e:
+        return f'{{"error": "An error occurred during revised document analysis: {type(e).__name__} - {str(e)}"}}'
+
 # ============================================
 # PDF Manipulation & Blueprint Tools
 # ============================================
@@ -231,74 +975,133 @@ def list_pdf_form_fields(pdf_path: str) -> str:
     except Exception as e:
         return f'{{"error": "An error occurred while processing the PDF: {str(e)}"}}'
 
-def create_fields_from_blueprint(pdf_path: str, json_blueprint_path: str) -> str:
-    """Adds empty form fields to a PDF based on a JSON blueprint file."""
-    try:
-        absolute_pdf_path = get_absolute_path(pdf_path)
-        with open(get_absolute_path(json_blueprint_path), 'r') as f:
+def _iter_blueprint_fields(blueprint_path: str):
+    """
+    Yields the fields of a blueprint file: a JSON object with a `form_fields` list, a JSON Lines
+    file with one field per line (read incrementally), or a compact binary `.npz` blueprint.
+    """
+    absolute_blueprint_path = get_absolute_path(blueprint_path)
+    if absolute_blueprint_path.endswith(f".{BLUEPRINT_EXTENSION}"):
+        yield from CompactBlueprint.load(absolute_blueprint_path).iter_fields()
+    elif absolute_blueprint_path.endswith(".jsonl"):
+        with open(absolute_blueprint_path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(absolute_blueprint_path, 'r') as f:
             blueprint = json.load(f)
+        yield from blueprint.get("form_fields", [])
+
+def _iter_blueprint_boxes(blueprint_path: str):
+    """
+    Yields (field_name, field_type, 1-based page number, normalized (x0, y0, x1, y1) or None if
+    the coordinates are malformed) for every field of a blueprint file. Compact blueprints are
+    read straight from their columns without building field dicts.
+    """
+    absolute_blueprint_path = get_absolute_path(blueprint_path)
+    if absolute_blueprint_path.endswith(f".{BLUEPRINT_EXTENSION}"):
+        blueprint = CompactBlueprint.load(absolute_blueprint_path)
+        yield from zip(blueprint.field_names(), blueprint.field_types(), (blueprint.page_index + 1).tolist(),
+                       blueprint.boxes.tolist())
+    else:
+        for field in _iter_blueprint_fields(blueprint_path):
+            yield (field.get("field_name", "unnamed"), field.get("field_type", "text"), field.get("page_number", 1),
+                   corners_to_box(field.get("coordinates")))
+
+CHECKED_VALUES = ("true", "yes", "y", "x", "1", "on", "checked")
+
+def _is_checked(value) -> bool:
+    """ Interprets a user-data value for a checkbox field. """
+    return str(value).strip().lower() in CHECKED_VALUES
+
+def _sanitize_field_name(name: str) -> str:
+    # Remove invalid characters, replace spaces with underscores
+    name = re.sub(r'[^a-zA-Z0-9_]', '', name.replace(' ', '_'))
+    # Truncate to a reasonable length
+    return name[:50]
+
+def _add_blueprint_widgets(doc, json_blueprint_path: str, user_data: dict = None) -> tuple:
+    """
+    Adds a text widget to `doc` for every valid field of a blueprint. With `user_data`, each
+    widget is created already holding its value, looked up by the unique PDF field name or,
+    for the first field with that name, by the blueprint's original `field_name`.
+    Returns (created field count, filled field count).
+    """
+    # Keep track of sanitized names to ensure uniqueness
+    used_field_names = set()
+    created_count = filled_count = 0
 
-        doc = fitz.open(absolute_pdf_path)
-        
-        # Keep track of sanitized names to ensure uniqueness
-        used_field_names = set()
-
-        def sanitize_field_name(name: str) -> str:
-            # Remove invalid characters, replace spaces with underscores
-            name = re.sub(r'[^a-zA-Z0-9_]', '', name.replace(' ', '_'))
-            # Truncate to a reasonable length
-            return name[:50]
-
-        for field in blueprint.get("form_fields", []):
-            page_num_one_based = field.get("page_number", 1)
-            if not (1 <= page_num_one_based <= len(doc)):
-                print(f"[DEBUG-PDF] Skipping field '{field.get('field_name')}' due to invalid page number: {page_num_one_based}.")
-                continue
-            
-            page = doc[page_num_one_based - 1]
-            coords = field.get("coordinates", [])
-
-            if not (isinstance(coords, list) and len(coords) == 4 and
-                    all(isinstance(p, dict) and 'x' in p and 'y' in p and
-                        isinstance(p['x'], (int, float)) and isinstance(p['y'], (int, float))
-                        for p in coords)):
-                print(f"[DEBUG-PDF] Skipping field '{field.get('field_name')}' due to invalid or malformed coordinates.")
-                continue
-
-            original_name = field.get("field_name", "unnamed")
-            sanitized_name = sanitize_field_name(original_name)
-            
-            # Ensure the field name is unique
-            unique_name = sanitized_name
-            counter = 1
-            while unique_name in used_field_names:
-                unique_name = f"{sanitized_name}_{counter}"
-                counter += 1
-            used_field_names.add(unique_name)
-
-            x0 = coords[0]['x'] * page.rect.width
-            y0 = coords[0]['y'] * page.rect.height
-            x1 = coords[2]['x'] * page.rect.width
-            y1 = coords[2]['y'] * page.rect.height
-
-            # Also validate the rectangle dimensions themselves to prevent errors
-            if x1 <= x0 or y1 <= y0:
-                print(f"[DEBUG-PDF] Skipping field '{unique_name}' due to invalid rectangle dimensions (x1 <= x0 or y1 <= y0). Coords: ({x0}, {y0}, {x1}, {y1})")
-                continue
-
-            rect = fitz.Rect(x0, y0, x1, y1)
-            
-            # Create widget by setting attributes for compatibility with older PyMuPDF.
-            widget = fitz.Widget()
-            widget.rect = rect
+    for original_name, field_type, page_num_one_based, box in _iter_blueprint_boxes(json_blueprint_path):
+        if not (1 <= page_num_one_based <= len(doc)):
+            print(f"[DEBUG-PDF] Skipping field '{original_name}' due to invalid page number: {page_num_one_based}.")
+            continue
+
+        page = doc[page_num_one_based - 1]
+
+        if box is None:
+            print(f"[DEBUG-PDF] Skipping field '{original_name}' due to invalid or malformed coordinates.")
+            continue
+
+        sanitized_name = _sanitize_field_name(original_name)
+
+        # Ensure the field name is unique
+        unique_name = sanitized_name
+        counter = 1
+        while unique_name in used_field_names:
+            unique_name = f"{sanitized_name}_{counter}"
+            counter += 1
+        used_field_names.add(unique_name)
+
+        x0 = box[0] * page.rect.width
+        y0 = box[1] * page.rect.height
+        x1 = box[2] * page.rect.width
+        y1 = box[3] * page.rect.height
+
+        # Also validate the rectangle dimensions themselves to prevent errors
+        if x1 <= x0 or y1 <= y0:
+            print(f"[DEBUG-PDF] Skipping field '{unique_name}' due to invalid rectangle dimensions (x1 <= x0 or y1 <= y0). Coords: ({x0}, {y0}, {x1}, {y1})")
+            continue
+
+        rect = fitz.Rect(x0, y0, x1, y1)
+
+        value = ""
+        if user_data:
+            if unique_name in user_data:
+                value = str(user_data[unique_name])
+            elif unique_name == sanitized_name and original_name in user_data:
+                value = str(user_data[original_name])
+            filled_count += bool(value)
+
+        # Create widget by setting attributes for compatibility with older PyMuPDF.
+        widget = fitz.Widget()
+        widget.rect = rect
+        widget.field_name = unique_name
+        if field_type == "checkbox":
+            widget.field_type = fitz.PDF_WIDGET_TYPE_CHECKBOX
+            widget.field_value = _is_checked(value)
+        else:
             widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
-            widget.field_name = unique_name
-            widget.field_value = ""
-            
-            page.add_widget(widget)
-        
+            widget.field_value = value
+
+        page.add_widget(widget)
+        created_count += 1
+
+    return created_count, filled_count
+
+def create_fields_from_blueprint(pdf_path: str, json_blueprint_path: str) -> str:
+    """
+    Adds empty form fields to a PDF based on a JSON (or JSON Lines) blueprint file.
+    The result is an intermediate file, so it is saved without garbage collection; the
+    final fill (or `compact_pdf`) compacts it.
+    """
+    try:
+        doc = fitz.open(get_absolute_path(pdf_path))
+        _add_blueprint_widgets(doc, json_blueprint_path)
+        write_field_index(doc, build_field_index(doc))
+
         output_path = get_output_path(pdf_path, "_fields_created")
-        doc.save(output_path, garbage=4, deflate=True, clean=True)
+        doc.save(output_path, deflate=True)
         return f'{{"success": true, "path": "{output_path}"}}'
     except Exception as e:
         tb_str = traceback.format_exc()
@@ -306,30 +1109,275 @@ def create_fields_from_blueprint(pdf_path: str, json_blueprint_path: str) -> str
         print(f"[DEBUG-PDF] {error_message}")
         return json.dumps({"error": error_message})
 
+def create_and_fill_form(pdf_path: str, json_blueprint_path: str, user_data_json: str,
+                         incremental: bool = False, compact: bool = False) -> str:
+    """
+    (One-Pass Tool) Creates the blueprint's form fields and fills them with user data in a
+    single open and a single save, instead of `create_fields_from_blueprint` followed by
+    `fill_form_fields`.
+
+    - `incremental`: appends the new widgets to a copy of the original file as an incremental
+      update instead of re-serializing the whole PDF. Falls back to a plain save when the
+      source does not allow it (e.g. repaired or encrypted files).
+    - `compact`: runs full garbage collection and cleanup as the final step. This rewrites
+      the whole file, so it cannot be combined with `incremental`.
+    """
+    try:
+        user_data = json.loads(user_data_json) if user_data_json else {}
+        absolute_pdf_path = get_absolute_path(pdf_path)
+        output_path = get_output_path(pdf_path, "_filled", clean_base_name=True)
+
+        save_mode = "compact" if compact else "full"
+        if incremental and not compact:
+            with fitz.open(absolute_pdf_path) as source:
+                can_append = source.can_save_incrementally()
+            if can_append:
+                # Incremental updates are appended to the file itself, so work on a copy of the original
+                shutil.copyfile(absolute_pdf_path, output_path)
+                save_mode = "incremental"
+            else:
+                print(f"[DEBUG-PDF] '{os.path.basename(pdf_path)}' does not allow incremental saves, writing a full copy.")
+
+        doc = fitz.open(output_path if save_mode == "incremental" else absolute_pdf_path)
+        created_count, filled_count = _add_blueprint_widgets(doc, json_blueprint_path, user_data)
+        write_field_index(doc, build_field_index(doc))
+
+        if save_mode == "incremental":
+            doc.save(output_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+        elif save_mode == "compact":
+            doc.save(output_path, garbage=4, deflate=True, clean=True)
+        else:
+            doc.save(output_path, deflate=True)
+        doc.close()
+        return json.dumps({"success": True, "path": output_path, "fields_created": created_count,
+                           "fields_filled": filled_count, "save_mode": save_mode})
+    except Exception as e:
+        tb_str = traceback.format_exc()
+        error_message = f"An error occurred during one-pass create and fill: {type(e).__name__} - {str(e)}\nTraceback:\n{tb_str}"
+        print(f"[DEBUG-PDF] {error_message}")
+        return json.dumps({"error": error_message})
+
+def compact_pdf(pdf_path: str) -> str:
+    """
+    (Final Compaction Tool) Rewrites a PDF with full garbage collection, stream compression and
+    content cleanup. Run once on a finished document; it is the expensive step the other
+    tools skip.
+    """
+    try:
+        output_path = get_output_path(pdf_path, "_compact")
+        with fitz.open(get_absolute_path(pdf_path)) as doc:
+            doc.save(output_path, garbage=4, deflate=True, clean=True)
+        return json.dumps({"success": True, "path": output_path,
+                           "size_bytes": os.path.getsize(output_path),
+                           "original_size_bytes": os.path.getsize(get_absolute_path(pdf_path))})
+    except Exception as e:
+        return f'{{"error": "An error occurred while compacting the PDF: {type(e).__name__} - {str(e)}"}}'
+
+def _fill_indexed_fields(doc, user_data: dict, check_missing: bool = True) -> tuple:
+    """
+    Sets widget values through the document's field index: only pages holding a requested
+    field are loaded, only their target widgets are touched, and the scan ends after the last
+    such page. A stale stored index (widgets added, moved or removed since it was written) is
+    rebuilt once; `check_missing=False` skips the rebuild for requested names missing from an
+    index the caller knows is current. Returns (names of filled fields, requested keys with no
+    matching field).
+    """
+    stored_index = read_field_index(doc)
+    index = stored_index if stored_index is not None else load_field_index(doc)
+    for attempt in range(2):
+        targets = {}
+        for name in user_data:
+            for page_num, position in index.get(name, []):
+                targets.setdefault(page_num, []).append((position, name))
+
+        # A requested name missing from a stored index may be a field added after it was written
+        stale = (check_missing and stored_index is not None and attempt == 0
+                 and any(name not in index for name in user_data))
+        for page_num in sorted(targets):
+            if stale:
+                break
+            if page_num >= len(doc):
+                stale = True
+                break
+            page = doc.load_page(page_num)
+            xrefs = resolve_widget_xrefs(page, [position for position, _ in targets[page_num]])
+            if None in xrefs:
+                stale = True
+                break
+            for xref, (_, name) in zip(xrefs, targets[page_num]):
+                widget = page.load_widget(xref)
+                if widget.field_name != name:
+                    stale = True
+                    break
+                value = str(user_data[name])
+                if widget.field_type == fitz.PDF_WIDGET_TYPE_CHECKBOX:
+                    widget.field_value = widget.on_state() if _is_checked(value) else "Off"
+                elif value:
+                    widget.field_value = value
+                else:
+                    # PyMuPDF ignores empty values on update, so clear /V directly and reload
+                    doc.xref_set_key(xref, "V", "()")
+                    widget = page.load_widget(xref)
+                widget.update()
+            widget = page = None
+            if stale:
+                break
+
+        if not stale or attempt:
+            break
+        print("[DEBUG-PDF] Stored field index is stale, rebuilding it.")
+        index = load_field_index(doc, rebuild=True)
+
+    filled_names = [name for name in user_data if name in index]
+    unmatched_keys = [name for name in user_data if name not in index]
+    return filled_names, unmatched_keys
+
 def fill_form_fields(pdf_path: str, user_data_json: str) -> str:
-    """Fills the existing form fields of a PDF with user data from a JSON string."""
+    """
+    Fills the existing form fields of a PDF with user data from a JSON string. Fields are found
+    through the field index stored in the PDF (built on first use), and any keys that match no
+    field are reported back in `unmatched_keys`.
+    """
     try:
         user_data = json.loads(user_data_json)
         doc = fitz.open(get_absolute_path(pdf_path))
-        for page in doc:
-            for field in page.widgets():
-                if field.field_name in user_data:
-                    field.field_value = str(user_data[field.field_name])
-                    field.update()
-        
+        filled_names, unmatched_keys = _fill_indexed_fields(doc, user_data)
+        if unmatched_keys:
+            print(f"[DEBUG-PDF] No form field matched these keys: {unmatched_keys}")
+
         output_path = get_output_path(pdf_path, "_filled", clean_base_name=True)
         doc.save(output_path, garbage=4, deflate=True, clean=True)
-        return f'{{"success": true, "path": "{output_path}"}}'
+        return json.dumps({"success": True, "path": output_path, "fields_filled": len(filled_names),
+                           "unmatched_keys": unmatched_keys})
     except Exception as e:
         return f'{{"error": "An error occurred: {type(e).__name__} - {str(e)}"}}'
 
+# ============================================
+# Mail-Merge Batch Filling
+# ============================================
+
+class _TemplateFiller:
+    """
+    One parsed copy of a fillable template that is filled and saved once per record. Between
+    records, fields set by the previous record but absent from the next are restored to their
+    template values, so each output only carries its own record's data.
+    """
+
+    def __init__(self, template_bytes: bytes):
+        self.doc = fitz.open("pdf", template_bytes)
+        # Built fresh once per template, so records with unknown keys never trigger a rebuild
+        load_field_index(self.doc, rebuild=True)
+        self.template_values = {}
+        for page in self.doc:
+            for widget in page.widgets():
+                self.template_values.setdefault(widget.field_name, widget.field_value or "")
+        self._applied_names = set()
+
+    def fill(self, record: dict, output_path: str) -> dict:
+        values = {name: self.template_values.get(name, "") for name in self._applied_names if name not in record}
+        values.update(record)
+        filled_names, _ = _fill_indexed_fields(self.doc, values, check_missing=False)
+        filled_names = set(filled_names)
+        self._applied_names = {name for name in record if name in filled_names}
+        # garbage=1 drops the appearance streams replaced by this record's values
+        self.doc.save(output_path, garbage=1, deflate=True)
+        return {"path": output_path, "fields_filled": len(self._applied_names),
+                "unmatched_keys": [name for name in record if name not in filled_names]}
+
+_batch_filler = None  # Per-process template, set by the pool initializer
+
+def _init_batch_fill_worker(template_bytes: bytes) -> None:
+    global _batch_filler
+    _batch_filler = _TemplateFiller(template_bytes)
+
+def _fill_batch_record(record: dict, output_path: str) -> dict:
+    return _batch_filler.fill(record, output_path)
+
+def _iter_batch_records(records_json: str):
+    """ Yields data records from a JSON array string, or streams them from a .jsonl file path. """
+    if records_json.strip().endswith(".jsonl"):
+        with open(get_absolute_path(records_json.strip()), "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from json.loads(records_json)
+
+def batch_fill_form_fields(pdf_path: str, records_json: str, max_workers: int = 0) -> str:
+    """
+    (Mail-Merge Tool) Fills one fillable template once per data record and writes one PDF per
+    record. `records_json` is a JSON array of objects (field name -> value) or the path of a
+    .jsonl file with one object per line, which is streamed. The template is read and parsed
+    once per worker process, so each output costs little more than its own save. At most
+    `max_workers` processes run at once (0 uses the BATCH_FILL_WORKERS setting).
+    """
+    try:
+        if max_workers <= 0:
+            max_workers = constants.BATCH_FILL_WORKERS
+        with open(get_absolute_path(pdf_path), "rb") as f:
+            template_bytes = f.read()
+        records = enumerate(_iter_batch_records(records_json), start=1)
+
+        def output_path_for(record_number: int) -> str:
+            return get_output_path(pdf_path, f"_filled_{record_number:04d}", clean_base_name=True)
+
+        outputs, failed = [], []
+        if max_workers <= 1:
+            filler = _TemplateFiller(template_bytes)
+            for record_number, record in records:
+                try:
+                    outputs.append({"record": record_number, **filler.fill(record, output_path_for(record_number))})
+                except Exception as e:
+                    failed.append({"record": record_number, "error": f"{type(e).__name__} - {str(e)}"})
+        else:
+            print(f"[DEBUG-PDF] Batch filling '{os.path.basename(pdf_path)}' across {max_workers} worker processes.")
+            executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_batch_fill_worker,
+                                           initargs=(template_bytes,))
+            try:
+                # Keep a bounded number of records in flight so a long record stream is never fully loaded
+                pending = {}
+                for record_number, record in records:
+                    pending[executor.submit(_fill_batch_record, record, output_path_for(record_number))] = record_number
+                    if len(pending) >= max_workers * 2:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        _collect_batch_results(done, pending, outputs, failed)
+                _collect_batch_results(wait(pending)[0], pending, outputs, failed)
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        outputs.sort(key=lambda output: output["record"])
+        failed.sort(key=lambda failure: failure["record"])
+        if not outputs:
+            return json.dumps({"error": "No records were filled.", "failed": failed})
+        return json.dumps({"success": True, "filled_count": len(outputs), "outputs": outputs, "failed": failed})
+    except Exception as e:
+        return f'{{"error": "An error occurred during batch filling: {type(e).__name__} - {str(e)}"}}'
+
+def _collect_batch_results(done: set, pending: dict, outputs: list, failed: list) -> None:
+    """ Moves finished batch-fill futures from `pending` into the outputs or failures. """
+    for future in done:
+        record_number = pending.pop(future)
+        try:
+            outputs.append({"record": record_number, **future.result()})
+        except Exception as e:
+            failed.append({"record": record_number, "error": f"{type(e).__name__} - {str(e)}"})
+
 # ============================================
 # Utility & Debugging Tools
 # ============================================
 
 def save_json_to_file(json_data: str, output_filename: str) -> str:
-    """Saves a JSON string to a file in the output directory."""
+    """
+    Saves a JSON string to a file in the output directory. If `output_filename` ends in
+    `.npz` and the data is a blueprint, it is saved in the compact binary blueprint format.
+    """
     try:
+        if output_filename.endswith(f".{BLUEPRINT_EXTENSION}"):
+            form_fields = json.loads(json_data).get("form_fields")
+            if form_fields is not None:
+                output_path = get_output_path(output_filename, "", new_extension=BLUEPRINT_EXTENSION)
+                CompactBlueprint.from_fields(form_fields).save(output_path)
+                return f'{{"success": true, "path": "{output_path}"}}'
         output_path = get_output_path(output_filename, "", new_extension='json')
         with open(output_path, 'w') as f:
             # First, validate if json_data is a string that can be loaded into a dict
@@ -341,13 +1389,53 @@ def save_json_to_file(json_data: str, output_filename: str) -> str:
     except Exception as e:
         return f'{{"error": "Failed to save file: {str(e)}"}}'
 
+def export_blueprint_json(blueprint_path: str) -> str:
+    """
+    Converts a compact `.npz` blueprint (or any blueprint file) to the public JSON format:
+    a `form_fields` list of dicts with four corner coordinates each. Also saves it as
+    `<name>_export.json` and returns that path.
+    """
+    try:
+        form_fields = list(_iter_blueprint_fields(blueprint_path))
+        output_path = get_output_path(blueprint_path, "_export", new_extension='json')
+        with open(output_path, 'w') as f:
+            json.dump({"form_fields": form_fields}, f)
+        return json.dumps({"success": True, "path": output_path, "form_fields": form_fields})
+    except Exception as e:
+        return f'{{"error": "Failed to export blueprint: {type(e).__name__} - {str(e)}"}}'
+
+def save_blueprint_layouts(pdf_path: str, json_blueprint_path: str) -> str:
+    """
+    Records the page layouts of a PDF together with the fields of a blueprint the user has
+    accepted, so later documents containing the same forms reuse these fields instead of
+    being analyzed. Pages without fields in the blueprint are recorded as having none; pages
+    without text (scans) are not recorded.
+    """
+    try:
+        form_fields = list(_iter_blueprint_fields(json_blueprint_path))
+        fields_by_page = {}
+        for field in form_fields:
+            fields_by_page.setdefault(field.get("page_number", 1) - 1, []).append(field)
+        with fitz.open(get_absolute_path(pdf_path)) as doc:
+            for page_num in range(len(doc)):
+                layout_index.add(page_fingerprint(doc.load_page(page_num)), fields_by_page.get(page_num, []),
+                                 os.path.basename(pdf_path))
+            page_count = len(doc)
+        return json.dumps({"success": True, "pages_recorded": page_count, **layout_index.stats()})
+    except Exception as e:
+        return f'{{"error": "An error occurred while saving blueprint layouts: {type(e).__name__} - {str(e)}"}}'
+
 def check_configuration() -> str:
-    """Checks and returns the loaded configuration for Azure Document AI."""
+    """Checks and returns the loaded configuration for Azure Document AI, including Azure cache hit/miss counts."""
     try:
         config = load_config()
-        return json.dumps({k: config.get(k, 'Not Set') for k in [
+        configuration = {k: config.get(k, 'Not Set') for k in [
             'AZURE_DOC_INTEL_ENDPOINT', 'AZURE_DOC_INTEL_KEY'
-        ]}, indent=2)
+        ]}
+        configuration['AZURE_CACHE'] = azure_layout_cache.stats() if constants.AZURE_CACHE_ENABLED else 'Disabled'
+        configuration['RENDER_CACHE'] = page_render_cache.stats() if constants.RENDER_CACHE_ENABLED else 'Disabled'
+        configuration['LAYOUT_INDEX'] = layout_index.stats() if constants.LAYOUT_INDEX_ENABLED else 'Disabled'
+        return json.dumps(configuration, indent=2)
     except Exception as e:
         return f"An error occurred while checking configuration: {str(e)}"
 
@@ -355,10 +1443,20 @@ def get_tools():
     """Returns the list of tools for the agent."""
     return [
         list_pdf_form_fields,
+        analyze_document_with_page_triage,
+        analyze_revised_document,
         create_form_field_blueprint_from_azure,
+        create_form_field_blueprints_from_azure_batch,
+        create_form_field_blueprint,
         extract_fields_with_local_heuristics,
+        extract_fields_with_local_heuristics_to_jsonl,
         save_json_to_file,
+        export_blueprint_json,
+        save_blueprint_layouts,
         create_fields_from_blueprint,
         fill_form_fields,
+        batch_fill_form_fields,
+        create_and_fill_form,
+        compact_pdf,
         check_configuration,
     ] 
\ No newline at end of file
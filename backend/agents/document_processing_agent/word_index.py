@@ -0,0 +1,49 @@
+import numpy as np
+
+# ============================================
+# Spatial Index over a Page's Words
+# ============================================
+
+class PageWordIndex:
+    """
+    Holds a page's words (as returned by `page.get_text("words")`) in array-backed coordinate
+    columns sorted by y0, so label lookups are a binary-searched range query plus a vectorized
+    mask instead of a fresh text extraction per candidate field.
+    """
+
+    def __init__(self, words: list):
+        self.words = list(words)
+        order = sorted(range(len(self.words)), key=lambda i: self.words[i][1])
+        self._order = np.asarray(order, dtype=np.int64)
+        coords = np.asarray([self.words[i][:4] for i in order], dtype=np.float64).reshape(-1, 4)
+        self.x0, self.y0, self.x1, self.y1 = coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3]
+        # The tallest word bounds how far above a query a matching word's y0 can start
+        self._max_height = float((self.y1 - self.y0).max()) if len(self.words) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def query(self, rect) -> list:
+        """
+        Returns the words that overlap `rect` horizontally and whose vertical centre lies inside
+        it, in the original extraction order. Like `get_text("words", clip=rect)`, a line that
+        only grazes the top or bottom edge is left out; unlike it, words crossing the left or
+        right edge are returned whole.
+        """
+        if not self.words:
+            return []
+        start = np.searchsorted(self.y0, rect.y0 - self._max_height, side="left")
+        stop = np.searchsorted(self.y0, rect.y1, side="right")
+        y_centre = (self.y0[start:stop] + self.y1[start:stop]) / 2
+        mask = ((self.x0[start:stop] <= rect.x1) & (self.x1[start:stop] >= rect.x0) &
+                (y_centre >= rect.y0) & (y_centre <= rect.y1))
+        hits = np.sort(self._order[start:stop][mask])
+        return [self.words[i] for i in hits]
+
+    def typical_height(self, default: float = 0.0) -> float:
+        """ Median word height on the page, i.e. the height of an ordinary line of text. """
+        return float(np.median(self.y1 - self.y0)) if self.words else default
+
+    def containing(self, substring: str) -> list:
+        """ Returns the words whose text contains `substring`, in extraction order. """
+        return [w for w in self.words if substring in w[4]]
@@ -14,4 +14,57 @@ MODEL = os.getenv("MODEL", "gemini-2.0-flash-001")
 
 DISABLE_WEB_DRIVER = int(os.getenv("DISABLE_WEB_DRIVER", "0"))
 WHL_FILE_NAME = os.getenv("ADK_WHL_FILE", "")
-STAGING_BUCKET = os.getenv("STAGING_BUCKET", "")
\ No newline at end of file
+STAGING_BUCKET = os.getenv("STAGING_BUCKET", "")
+
+# Number of worker processes used by the local heuristics tool (1 = serial).
+LOCAL_HEURISTICS_WORKERS = int(os.getenv("LOCAL_HEURISTICS_WORKERS", "1"))
+
+# On-disk cache of Azure Document Intelligence layout results.
+AZURE_CACHE_ENABLED = int(os.getenv("AZURE_CACHE_ENABLED", "1"))
+AZURE_CACHE_MAX_MB = int(os.getenv("AZURE_CACHE_MAX_MB", "512"))
+# Maximum number of Azure analyses the batch engine runs at once.
+AZURE_MAX_CONCURRENCY = int(os.getenv("AZURE_MAX_CONCURRENCY", "8"))
+
+# Which tier wins when Azure and local analysis race: prefer_azure, prefer_local or first_valid.
+BLUEPRINT_POLICY = os.getenv("BLUEPRINT_POLICY", "prefer_azure")
+
+# Resolution used to find lines on scanned pages. Below 300, lines are detected on a
+# low-resolution render and only their neighbourhoods are re-rendered at 300 DPI.
+RASTER_DETECT_DPI = int(os.getenv("RASTER_DETECT_DPI", "300"))
+
+# Memory-mapped cache of grayscale page renders used by the raster engine. Off by default:
+# an entry is ~8.7 MB per page at 300 DPI and only saves time on scanned pages that are
+# re-analyzed (see benchmark_page_render_cache in document_processing_agent/benchmarks.py).
+RENDER_CACHE_ENABLED = int(os.getenv("RENDER_CACHE_ENABLED", "0"))
+RENDER_CACHE_MAX_MB = int(os.getenv("RENDER_CACHE_MAX_MB", "2048"))
+
+# Reuse of blueprints for recurring form layouts, matched by page fingerprint.
+LAYOUT_INDEX_ENABLED = int(os.getenv("LAYOUT_INDEX_ENABLED", "1"))
+# Maximum perceptual-hash distance (in bits, out of 64) for two pages to count as the same layout.
+LAYOUT_MATCH_MAX_DISTANCE = int(os.getenv("LAYOUT_MATCH_MAX_DISTANCE", "6"))
+
+# Number of worker processes used to mail-merge fill one template for many records.
+BATCH_FILL_WORKERS = int(os.getenv("BATCH_FILL_WORKERS", "4"))
+
+# Pool of Chrome WebDrivers leased to bid discovery sessions.
+WEB_DRIVER_POOL_SIZE = int(os.getenv("WEB_DRIVER_POOL_SIZE", "4"))
+# Number of idle browsers kept pre-warmed.
+WEB_DRIVER_MIN_IDLE = int(os.getenv("WEB_DRIVER_MIN_IDLE", "1"))
+# A browser is recycled after this many navigations or once its page heap exceeds this many MB.
+WEB_DRIVER_MAX_NAVIGATIONS = int(os.getenv("WEB_DRIVER_MAX_NAVIGATIONS", "200"))
+WEB_DRIVER_MAX_MEMORY_MB = int(os.getenv("WEB_DRIVER_MAX_MEMORY_MB", "1024"))
+# Leases unused for this long are reclaimed; checkouts wait this long for a free browser.
+WEB_DRIVER_LEASE_TIMEOUT_SECONDS = int(os.getenv("WEB_DRIVER_LEASE_TIMEOUT_SECONDS", "300"))
+WEB_DRIVER_CHECKOUT_TIMEOUT_SECONDS = int(os.getenv("WEB_DRIVER_CHECKOUT_TIMEOUT_SECONDS", "60"))
+
+# Search each requested portal in its own concurrent agent run and merge the results.
+DISCOVERY_FAN_OUT = int(os.getenv("DISCOVERY_FAN_OUT", "1"))
+# Maximum portal searches running at once across all requests (each one holds a pooled browser).
+DISCOVERY_MAX_CONCURRENT_PORTALS = int(os.getenv("DISCOVERY_MAX_CONCURRENT_PORTALS", str(WEB_DRIVER_POOL_SIZE)))
+# A portal search still running after this long is stopped and its partial results are kept.
+DISCOVERY_PORTAL_TIMEOUT_SECONDS = int(os.getenv("DISCOVERY_PORTAL_TIMEOUT_SECONDS", "300"))
+
+# Page source is distilled to an outline of visible text and interactive elements before it
+# reaches the model, within this many tokens (roughly 4 characters each).
+DOM_DISTILL_ENABLED = int(os.getenv("DOM_DISTILL_ENABLED", "1"))
+DOM_DISTILL_TOKEN_BUDGET = int(os.getenv("DOM_DISTILL_TOKEN_BUDGET", "8000"))
@@ -1,3 +1,4 @@
+import hashlib
 import os
 
 def get_absolute_path(relative_or_absolute_path: str) -> str:
@@ -32,4 +33,24 @@ def get_output_path(original_path: str, suffix: str, new_extension: str = "pdf",
         true_base_name = true_base_name.replace('_fields_created', '')
 
     new_filename = f"{true_base_name}{suffix}.{new_extension}"
-    return os.path.join(output_dir, new_filename) 
\ No newline at end of file
+    return os.path.join(output_dir, new_filename) 
+
+def get_cache_dir(name: str) -> str:
+    """
+    Returns the directory for a named on-disk cache under output/.cache, creating it if needed.
+    """
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+    cache_dir = os.path.join(project_root, "output", ".cache", name)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Returns the SHA-256 hex digest of a file's bytes, reading it in chunks so large
+    PDFs are never held in memory at once.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,79 @@
+import os
+import sys
+import shutil
+import types
+
+import fitz  # PyMuPDF
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+# The `agents` and `Bid_Discovery` package __init__ files build the ADK agent tree on import.
+# The tests exercise the tool modules directly, so those two packages are registered without
+# running their __init__.
+for package in ("backend.agents", "backend.agents.Bid_Discovery"):
+    if package not in sys.modules:
+        module = types.ModuleType(package)
+        module.__path__ = [os.path.join(PROJECT_ROOT, *package.split("."))]
+        sys.modules[package] = module
+
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """ Returns a function that saves a fitz document into the test's temp dir and returns its path. """
+    def save(doc, name="form.pdf"):
+        path = str(tmp_path / name)
+        doc.save(path)
+        doc.close()
+        return path
+    return save
+
+
+@pytest.fixture(autouse=True)
+def no_persistent_caches(monkeypatch):
+    """ Tests never read or write the on-disk caches under output/.cache. """
+    from backend.agents.shared_libraries import constants
+    for setting in ("AZURE_CACHE_ENABLED", "RENDER_CACHE_ENABLED", "LAYOUT_INDEX_ENABLED"):
+        monkeypatch.setattr(constants, setting, 0)
+
+
+@pytest.fixture(autouse=True)
+def remove_new_outputs():
+    """ Deletes whatever a test wrote to the repo's output/ directory (get_output_path has no override). """
+    output_dir = os.path.join(PROJECT_ROOT, "output")
+    before = set(os.listdir(output_dir)) if os.path.isdir(output_dir) else None
+    yield
+    if not os.path.isdir(output_dir):
+        return
+    if before is None:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        return
+    for name in set(os.listdir(output_dir)) - before:
+        path = os.path.join(output_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+
+def _draw_ruled_form(rows: int, line_spacing: float = 26, label_prefix: str = "Field label",
+                     rule_offset: float = 1) -> fitz.Document:
+    """
+    A born-digital form: one `<label>:` followed by a drawn rule per row, `rule_offset` points
+    below the label's baseline.
+    """
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 60), "Vendor Registration Form - complete every field below", fontsize=12)
+    for i in range(rows):
+        y = 100 + i * line_spacing
+        page.insert_text((72, y), f"{label_prefix} {chr(ord('A') + i)}:", fontsize=11)
+        page.draw_line((200, y + rule_offset), (450, y + rule_offset), width=0.75)
+    return doc
+
+
+@pytest.fixture
+def draw_ruled_form():
+    return _draw_ruled_form
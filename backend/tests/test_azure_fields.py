@@ -0,0 +1,145 @@
+import warnings
+
+from azure.ai.documentintelligence.models import AnalyzeResult, DocumentAnalysisFeature
+
+from backend.agents.document_processing_agent import tools
+from backend.agents.document_processing_agent.azure_cache import AzureLayoutCache
+
+
+def _box(x0, y0, x1, y1):
+    """ Polygon for a box given in inches, in 1/72in units so the label heuristic's offsets apply. """
+    x0, y0, x1, y1 = (value * 72 for value in (x0, y0, x1, y1))
+    return [x0, y0, x1, y0, x1, y1, x0, y1]
+
+
+def _word(content, box, confidence=0.99):
+    return {"content": content, "polygon": _box(*box), "confidence": confidence, "span": {"offset": 0, "length": len(content)}}
+
+
+def _region(box):
+    return {"pageNumber": 1, "polygon": _box(*box)}
+
+
+def _analyze_result(extra_pairs=()) -> AnalyzeResult:
+    """ One 8.5x11in page: a key-value pair, a plain colon label, a low-confidence colon and two checkboxes. """
+    return AnalyzeResult({
+        "modelId": "prebuilt-layout",
+        "pages": [{
+            "pageNumber": 1, "width": 612, "height": 792, "unit": "pixel",
+            "words": [
+                _word("Company", (1.0, 1.0, 1.6, 1.2)), _word("Name:", (1.65, 1.0, 2.1, 1.2)),
+                _word("Phone:", (1.0, 2.0, 1.5, 2.2)),
+                _word("smudge:", (1.0, 3.0, 1.5, 3.2), confidence=0.2),
+                _word("Certified", (1.3, 4.0, 2.0, 4.2)), _word("Signature", (1.3, 5.0, 2.0, 5.2)),
+            ],
+            "selectionMarks": [
+                {"state": "unselected", "polygon": _box(1.0, 4.0, 1.2, 4.2), "confidence": 0.9, "span": {"offset": 0, "length": 1}},
+                {"state": "unselected", "polygon": _box(1.0, 5.0, 1.2, 5.2), "confidence": 0.9, "span": {"offset": 0, "length": 1}},
+            ],
+        }],
+        "keyValuePairs": [{
+            "key": {"content": "Company Name:", "boundingRegions": [_region((1.0, 1.0, 2.1, 1.2))], "spans": []},
+            "value": {"content": "", "boundingRegions": [_region((2.3, 1.0, 5.0, 1.2))], "spans": []},
+            "confidence": 0.9,
+        }, *extra_pairs],
+    })
+
+
+def test_key_value_pairs_name_fields_and_use_the_value_region():
+    fields = {field["field_name"]: field for field in tools._fields_from_azure_result(_analyze_result())}
+
+    assert set(fields) == {"Company Name", "Phone", "Certified"}
+    assert fields["Company Name"]["field_type"] == "text"
+    top_left = fields["Company Name"]["coordinates"][0]
+    assert abs(top_left["x"] - 2.3 / 8.5) < 1e-9 and abs(top_left["y"] - 1.0 / 11) < 1e-9
+    # Colon label heuristic still applies where Azure found no pair
+    assert fields["Phone"]["coordinates"][0]["x"] > 1.5 / 8.5
+    assert fields["Certified"]["field_type"] == "checkbox"
+
+
+def test_key_value_pair_without_a_value_region_uses_the_label_box():
+    result = _analyze_result(extra_pairs=[{
+        "key": {"content": "Phone:", "boundingRegions": [_region((1.0, 2.0, 1.5, 2.2))], "spans": []},
+        "confidence": 0.9,
+    }])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        fields = {field["field_name"]: field for field in tools._fields_from_azure_result(result)}
+
+    top_left = fields["Phone"]["coordinates"][0]
+    assert abs(top_left["x"] - (1.5 * 72 + 10) / 612) < 1e-9
+    assert abs(fields["Company Name"]["coordinates"][0]["x"] - 2.3 / 8.5) < 1e-9
+
+
+def test_azure_analysis_requests_key_value_pairs(make_pdf, monkeypatch):
+    import fitz  # PyMuPDF
+    doc = fitz.open()
+    doc.new_page()
+    pdf_path = make_pdf(doc)
+    calls = []
+
+    class FakePoller:
+        def result(self, timeout=None):
+            return _analyze_result()
+
+    class FakeClient:
+        def begin_analyze_document(self, model_id, body, **kwargs):
+            calls.append(kwargs)
+            return FakePoller()
+
+    monkeypatch.setattr(tools, "get_document_intelligence_client", lambda: FakeClient())
+    fields, _ = tools._analyze_with_azure(pdf_path)
+
+    assert calls[0]["features"] == [DocumentAnalysisFeature.KEY_VALUE_PAIRS]
+    assert "Company Name" in {field["field_name"] for field in fields}
+
+
+def test_cache_key_depends_on_requested_features():
+    plain = AzureLayoutCache.make_key("sha", "prebuilt-layout")
+    with_pairs = AzureLayoutCache.make_key("sha", "prebuilt-layout", features=[DocumentAnalysisFeature.KEY_VALUE_PAIRS])
+    assert plain != with_pairs
+
+
+def test_async_engine_closes_its_client(make_pdf, monkeypatch):
+    import asyncio
+    import fitz  # PyMuPDF
+    from backend.agents.document_processing_agent import azure_engine
+
+    paths = []
+    for name in ("a.pdf", "b.pdf"):
+        doc = fitz.open()
+        doc.new_page()
+        paths.append(make_pdf(doc, name))
+    clients = []
+
+    class FakePoller:
+        async def result(self):
+            return _analyze_result()
+
+    class FakeAsyncClient:
+        def __init__(self):
+            self.closed = False
+            self.calls = []
+            clients.append(self)
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            self.closed = True
+
+        async def begin_analyze_document(self, model_id, body, **kwargs):
+            self.calls.append(kwargs)
+            return FakePoller()
+
+    monkeypatch.setattr(azure_engine, "create_async_document_intelligence_client", FakeAsyncClient)
+    engine = azure_engine.AzureAnalysisEngine()
+    results = asyncio.run(engine.analyze_many(paths))
+    asyncio.run(engine.analyze(paths[0]))
+
+    assert all(isinstance(result, AnalyzeResult) for result in results)
+    # One shared client for the batch, one for the single analysis, both closed
+    assert [len(client.calls) for client in clients] == [2, 1]
+    assert all(client.closed for client in clients)
+    assert all(call["features"] == [DocumentAnalysisFeature.KEY_VALUE_PAIRS] for client in clients for call in client.calls)
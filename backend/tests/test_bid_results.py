@@ -0,0 +1,39 @@
+from backend.agents.Bid_Discovery.sub_agents.search_results.bid_results import extract_bids, merge_bids
+
+
+def test_extract_bids_accepts_arrays_objects_fences_and_prose():
+    bid = {"title": "Roof Repair", "agency": "City of Springfield"}
+
+    assert extract_bids('[{"title": "Roof Repair", "agency": "City of Springfield"}]') == [bid]
+    assert extract_bids('{"bids": [{"title": "Roof Repair", "agency": "City of Springfield"}]}') == [bid]
+    assert extract_bids('Here you go:\n```json\n[{"title": "Roof Repair", "agency": "City of Springfield"}]\n```') == [bid]
+    assert extract_bids('I found [{"title": "Roof Repair", "agency": "City of Springfield"}] on the portal.') == [bid]
+
+
+def test_extract_bids_returns_nothing_for_answers_without_bids():
+    assert extract_bids(None) == []
+    assert extract_bids("No opportunities matched the search.") == []
+    assert extract_bids("[not json]") == []
+    assert extract_bids('[1, "two", {"title": "Kept"}]') == [{"title": "Kept"}]
+
+
+def test_merge_bids_folds_duplicates_across_portals():
+    sam = [
+        {"title": "Roof Repair", "agency": "City of Springfield", "solicitation_number": "RFP-001", "deadline": ""},
+        {"title": "Paving", "agency": "County", "url": "https://sam.gov/opp/2"},
+    ]
+    state = [
+        # Same solicitation number, written differently, and a deadline the first portal lacked
+        {"title": "ROOF REPAIR", "solicitation_number": "rfp 001", "deadline": "2026-11-30"},
+        # Matches on title and agency only
+        {"title": "Paving!", "agency": "county"},
+        {"title": "Snow Removal", "agency": "County"},
+    ]
+
+    merged = merge_bids([("sam.gov", sam), ("state", state)])
+
+    assert [bid["title"] for bid in merged] == ["Roof Repair", "Paving", "Snow Removal"]
+    assert merged[0]["deadline"] == "2026-11-30"
+    assert merged[0]["portals"] == ["sam.gov", "state"]
+    assert merged[1]["portals"] == ["sam.gov", "state"]
+    assert merged[2]["portals"] == ["state"]
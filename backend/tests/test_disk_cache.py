@@ -0,0 +1,30 @@
+import os
+
+import numpy as np
+import pytest
+
+from backend.agents.document_processing_agent.azure_cache import AzureLayoutCache
+from backend.agents.document_processing_agent.render_cache import PageRenderCache
+
+
+@pytest.mark.parametrize("cache_class, value", [
+    (AzureLayoutCache, {"pages": [{"pageNumber": 1}]}),
+    (PageRenderCache, np.arange(64, dtype=np.uint8).reshape(8, 8)),
+])
+def test_least_recently_used_entry_is_evicted_first(tmp_path, cache_class, value):
+    probe = cache_class(str(tmp_path / "probe"), max_bytes=1 << 20)
+    probe.put("probe", value)
+    entry_bytes = probe.stats()["size_bytes"]
+
+    cache = cache_class(str(tmp_path / "cache"), max_bytes=2 * entry_bytes)
+    cache.put("a", value)
+    cache.put("b", value)
+    for age, key in enumerate(("a", "b")):
+        os.utime(cache._entry_path(key), (1000 + age, 1000 + age))
+    assert cache.get("a") is not None  # Refreshes "a", leaving "b" the oldest
+    cache.put("c", value)
+
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.stats()["entries"] == 2
+    assert (cache.hits, cache.misses) == (2, 1)
@@ -0,0 +1,85 @@
+from backend.agents.Bid_Discovery.sub_agents.search_results.dom_distiller import (
+    describe_page_update, diff_outlines, distill_html, outline_nodes
+)
+
+
+def _results_page(count: int) -> str:
+    results = "".join(
+        f'<div class="result"><h3><a href="/opp/{1000 + i}">Roof Repair Services {i}</a></h3>'
+        f'<span>City of Springfield</span> <span>Due 2026-11-{i % 28 + 1:02d}</span>'
+        f'<button>Save</button></div>'
+        for i in range(count)
+    )
+    return (
+        "<html><head><title>Search results</title></head><body>"
+        '<form><input type="text" id="keyword" placeholder="Keyword"><input type="text" name="location">'
+        '<select><option>Open</option><option>Closed</option></select><button>Search</button></form>'
+        f'<div id="results">{results}</div></body></html>'
+    )
+
+
+def test_outline_is_smaller_than_the_results_page():
+    html = _results_page(40)
+    assert len(distill_html(html, token_budget=100_000)) < len(html)
+
+
+def test_only_form_controls_carry_selectors():
+    lines = outline_nodes(_results_page(2))
+
+    assert '[input:text] placeholder="Keyword" {"id": "keyword"}' in lines
+    assert '[input:text] {"name": "location"}' in lines
+    assert any(line.startswith("[select]") and line.endswith('"}') for line in lines)
+    assert "### [link] \"Roof Repair Services 0\" href=/opp/1000" in lines
+    assert '[button] "Save"' in lines
+
+
+def _outline(count: int) -> list:
+    return [f"Result card {i:03d} - City of Springfield, due 2026-11-{i % 28 + 1:02d}" for i in range(count)]
+
+
+def test_diff_outlines_reports_added_removed_and_changed_lines():
+    previous = ["Title: Results", "card A", "card B", "card C"]
+    current = ["Title: Results", "card A", "card B (closed)", "card C", "card D"]
+
+    diff = diff_outlines(previous, current)
+
+    assert (diff["added"], diff["removed"], diff["changed"]) == (1, 0, 1)
+    assert diff["lines"] == ["@@ after: card A", "~ card B (closed)  (was: card B)", "@@ after: card C", "+ card D"]
+    assert diff["sources"] == [None, 2, None, 4]
+
+
+def test_describe_page_update_sends_only_changes():
+    previous = _outline(30)
+    current = previous[:10] + ["New card"] + previous[10:]
+
+    text, seen = describe_page_update(previous, current, token_budget=10_000)
+
+    assert text.splitlines()[1:] == [f"@@ after: {previous[9]}", "+ New card"]
+    assert seen == current
+    assert describe_page_update(current, current) == ("No changes on the page since the last observation.", current)
+
+
+def test_lines_cut_by_the_budget_are_sent_on_later_reads():
+    page = _outline(100)
+    budget = 400  # About 30 of these lines
+
+    text, seen = describe_page_update(None, page, token_budget=budget)
+    assert "outline truncated" in text
+    first_read = len(seen)
+    assert seen == page[:first_read] and first_read < 40
+
+    # Two cards load at the top; the reply has them, then the lines cut from the first read
+    page = ["Promoted card 1", "Promoted card 2"] + page
+    text, seen = describe_page_update(seen, page, token_budget=budget)
+    assert "+ Promoted card 1" in text
+    assert f"+ {page[2 + first_read]}" in text
+
+    received = set(line[2:] for line in text.splitlines() if line.startswith("+ "))
+    for _ in range(20):
+        if seen == page:
+            break
+        text, seen = describe_page_update(seen, page, token_budget=budget)
+        received |= set(line[2:] for line in text.splitlines() if line.startswith("+ "))
+    assert seen == page
+    assert set(page[2 + first_read:]) <= received
+    assert describe_page_update(seen, page, token_budget=budget)[0] == "No changes on the page since the last observation."
@@ -0,0 +1,104 @@
+import threading
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+from backend.agents.Bid_Discovery.sub_agents.search_results.driver_pool import WebDriverPool
+
+
+class FakeBrowsers:
+    """ Factory of fake WebDrivers that tracks how many browser processes are alive at once. """
+
+    def __init__(self, start_seconds=0.02, quit_seconds=0.02):
+        self.start_seconds, self.quit_seconds = start_seconds, quit_seconds
+        self._lock = threading.Lock()
+        self.started = self.live = self.max_live = 0
+
+    def __call__(self):
+        time.sleep(self.start_seconds)
+        with self._lock:
+            self.started += 1
+            self.live += 1
+            self.max_live = max(self.max_live, self.live)
+        return FakeDriver(self)
+
+
+class FakeDriver:
+    def __init__(self, browsers):
+        self.browsers = browsers
+        self.crashed = False
+
+    def execute_script(self, script):
+        if self.crashed:
+            raise WebDriverException("browser crashed")
+        return 0 if "memory" in script else 1
+
+    def delete_all_cookies(self):
+        pass
+
+    def get(self, url):
+        pass
+
+    def quit(self):
+        time.sleep(self.browsers.quit_seconds)
+        with self.browsers._lock:
+            self.browsers.live -= 1
+
+
+def make_pool(browsers, max_size=2, min_idle=1, max_navigations=2, checkout_timeout=10):
+    return WebDriverPool(max_size=max_size, min_idle=min_idle, max_navigations=max_navigations, max_memory_mb=0,
+                         lease_timeout=900, checkout_timeout=checkout_timeout, factory=browsers)
+
+
+def test_concurrent_leases_never_exceed_max_size():
+    browsers = FakeBrowsers()
+    pool = make_pool(browsers)
+    errors = []
+
+    def session(worker):
+        try:
+            for round_number in range(6):
+                session_id = f"{worker}-{round_number}"
+                driver = pool.lease(session_id)
+                pool.record_navigation(session_id)
+                if (worker + round_number) % 5 == 0:
+                    driver.crashed = True  # Recycled on release
+                pool.release(session_id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=session, args=(worker,)) for worker in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.shutdown()
+
+    assert not errors
+    assert browsers.started > pool.max_size  # Browsers were recycled and replaced along the way
+    assert browsers.max_live <= pool.max_size
+    assert browsers.live == 0
+
+
+def test_lease_waits_for_a_free_browser_then_times_out():
+    pool = make_pool(FakeBrowsers(), max_size=1, min_idle=0, checkout_timeout=0.2)
+    first = pool.lease("a")
+    assert pool.lease("a") is first
+    try:
+        pool.lease("b")
+        raise AssertionError("expected the checkout to time out")
+    except TimeoutError:
+        pass
+    pool.release("a")
+    assert pool.lease("b") is first
+    pool.shutdown()
+
+
+def test_crashed_browser_is_replaced():
+    pool = make_pool(FakeBrowsers(), min_idle=0)
+    driver = pool.lease("a")
+    driver.crashed = True
+    pool._leased["a"].last_health_check -= 60  # Due for a health check
+    replacement = pool.lease("a")
+    assert replacement is not driver and not replacement.crashed
+    pool.shutdown()
@@ -0,0 +1,51 @@
+import json
+
+import fitz  # PyMuPDF
+
+from backend.agents.document_processing_agent import tools
+from backend.agents.document_processing_agent.field_index import read_field_index
+
+
+def _add_text_widget(page, name: str, rect) -> None:
+    widget = fitz.Widget()
+    widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+    widget.field_name = name
+    widget.rect = fitz.Rect(rect)
+    page.add_widget(widget)
+
+
+def _widget_values(path: str) -> dict:
+    with fitz.open(path) as doc:
+        return {widget.field_name: widget.field_value for page in doc for widget in page.widgets()}
+
+
+def test_fill_finds_fields_added_after_the_index_was_stored(make_pdf):
+    doc = fitz.open()
+    page = doc.new_page()
+    _add_text_widget(page, "Name", (72, 72, 300, 90))
+    pdf_path = make_pdf(doc, "indexed.pdf")
+    first = json.loads(tools.fill_form_fields(pdf_path, json.dumps({"Name": "Ada"})))
+
+    # Another editor adds a field; the index stored by the first fill does not know it
+    doc = fitz.open(first["path"])
+    assert "Company" not in read_field_index(doc)
+    _add_text_widget(doc[0], "Company", (72, 100, 300, 118))
+    edited_path = make_pdf(doc, "edited.pdf")
+
+    result = json.loads(tools.fill_form_fields(edited_path, json.dumps({"Name": "Ada", "Company": "Acme", "Missing": "x"})))
+
+    assert result["unmatched_keys"] == ["Missing"]
+    assert result["fields_filled"] == 2
+    values = _widget_values(result["path"])
+    assert values["Company"] == "Acme" and values["Name"] == "Ada"
+
+
+def test_batch_fill_reports_unknown_keys(make_pdf):
+    doc = fitz.open()
+    _add_text_widget(doc.new_page(), "Name", (72, 72, 300, 90))
+    pdf_path = make_pdf(doc, "template.pdf")
+
+    result = json.loads(tools.batch_fill_form_fields(pdf_path, json.dumps([{"Name": "Ada", "Extra": 1}, {"Name": "Bo"}]), max_workers=1))
+
+    assert [output["unmatched_keys"] for output in result["outputs"]] == [["Extra"], []]
+    assert [_widget_values(output["path"])["Name"] for output in result["outputs"]] == ["Ada", "Bo"]
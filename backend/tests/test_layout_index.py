@@ -0,0 +1,91 @@
+import json
+
+import fitz  # PyMuPDF
+import numpy as np
+import pytest
+
+from backend.agents.document_processing_agent import tools
+from backend.agents.document_processing_agent.layout_index import LayoutIndex, page_fingerprint
+from backend.agents.shared_libraries import constants
+
+
+def _numbered_item_pages(count: int) -> fitz.Document:
+    """ Pages identical except for their item number: "Item 1" ... "Item <count>". """
+    doc = fitz.open()
+    for item in range(1, count + 1):
+        page = doc.new_page()
+        page.insert_text((72, 60), f"Item {item} - Supplier Schedule, complete every field below", fontsize=12)
+        for row in range(3):
+            y = 100 + row * 26
+            page.insert_text((72, y), f"Label{item} {chr(ord('A') + row)}:", fontsize=11)
+            page.draw_line((200, y + 1), (450, y + 1), width=0.75)
+    return doc
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, "LAYOUT_INDEX_ENABLED", 1)
+    index = LayoutIndex(str(tmp_path / "index.json"), constants.LAYOUT_MATCH_MAX_DISTANCE)
+    monkeypatch.setattr(tools, "layout_index", index)
+    return index
+
+
+def test_numbered_pages_get_distinct_fingerprints():
+    doc = _numbered_item_pages(6)
+    hashes = {page_fingerprint(page)["text_hash"] for page in doc}
+    assert len(hashes) == 6
+
+
+def test_scanned_pages_are_never_reused(index):
+    doc = fitz.open()
+    page = doc.new_page()
+    pixels = np.full((200, 150, 3), 255, dtype=np.uint8)
+    pixels[100:102, 30:120] = 0
+    page.insert_image(page.rect, pixmap=fitz.Pixmap(fitz.csRGB, 150, 200, pixels.tobytes(), False))
+    fingerprint = page_fingerprint(page)
+
+    assert not fingerprint["has_text"]
+    index.add(fingerprint, [{"field_name": "scan_field", "page_number": 1, "rect": [0, 0, 10, 10]}], "scan.pdf")
+    assert index.stats()["layouts"] == 0
+    assert index.fields_for_page(fingerprint, 1) is None
+
+
+def test_only_accepted_blueprints_are_reused_page_by_page(index, make_pdf):
+    pdf_path = make_pdf(_numbered_item_pages(6), "items.pdf")
+
+    # Analysis alone records nothing: its output has not been reviewed
+    first = json.loads(tools.analyze_document_with_page_triage(pdf_path))
+    assert first["reused_layout_pages"] == []
+    assert index.stats()["layouts"] == 0
+
+    saved = json.loads(tools.save_blueprint_layouts(pdf_path, first["blueprint_path"]))
+    assert saved["layouts"] == 6
+
+    second = json.loads(tools.analyze_document_with_page_triage(pdf_path))
+    assert second["reused_layout_pages"] == [1, 2, 3, 4, 5, 6]
+    fields = list(tools._iter_blueprint_fields(second["blueprint_path"]))
+    assert len(fields) == 18
+    for field in fields:
+        assert field["field_name"].startswith(f"Label{field['page_number']}")
+
+
+def test_pages_are_only_rendered_when_a_layout_could_match(index, monkeypatch):
+    from backend.agents.document_processing_agent import layout_index as layout_index_module
+    rendered = []
+    perceptual_hash = layout_index_module._perceptual_hash
+    monkeypatch.setattr(layout_index_module, "_perceptual_hash", lambda page: rendered.append(page.number) or perceptual_hash(page))
+    doc = _numbered_item_pages(2)
+    doc.new_page().draw_rect(fitz.Rect(72, 72, 300, 200), width=1)  # A page with drawings but no text
+    triage = {"vector_form": [0, 1, 2]}
+
+    # Nothing stored yet: no page is fingerprinted at all
+    assert tools._fingerprint_pages(doc, triage) == {}
+    assert rendered == []
+
+    index.add(page_fingerprint(doc[0]), [{"field_name": "f", "page_number": 1, "rect": [0, 0, 10, 10]}], "items.pdf")
+    rendered.clear()
+    fingerprints = tools._fingerprint_pages(doc, triage)
+
+    assert set(fingerprints) == {0, 1, 2}
+    assert not fingerprints[2]["has_text"] and fingerprints[2]["phash"] is None
+    assert rendered == [0, 1]
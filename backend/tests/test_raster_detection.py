@@ -0,0 +1,26 @@
+import pytest
+
+from backend.agents.document_processing_agent import tools
+
+
+def _rounded(rects) -> set:
+    return {tuple(round(value) for value in rect) for rect in rects}
+
+
+@pytest.mark.parametrize("detect_dpi", [72, 100, 150])
+def test_low_resolution_detection_matches_full_resolution(draw_ruled_form, detect_dpi):
+    doc = draw_ruled_form(5, line_spacing=60, rule_offset=20)
+    page = doc[0]
+    for i in range(12):
+        page.insert_text((72, 420 + i * 13), "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod", fontsize=10)
+    page.draw_line((72, 620), (540, 620), width=0.5)
+
+    full = _rounded(tools._detect_raster_line_rects(page, 0, detect_dpi=tools.RASTER_DPI))
+    coarse = _rounded(tools._detect_raster_line_rects(page, 0, detect_dpi=detect_dpi))
+
+    # Every low-resolution line is one the full-resolution detector also finds...
+    assert coarse <= full
+    # ...and no drawn rule is lost
+    rules = {rect for rect in full if rect[2] - rect[0] > 100}
+    assert len(rules) == 6
+    assert rules <= coarse
@@ -0,0 +1,34 @@
+import json
+
+import fitz  # PyMuPDF
+
+from backend.agents.document_processing_agent import tools
+from backend.agents.document_processing_agent.revisions import match_unchanged_pages, page_content_hashes
+
+
+def test_blank_page_hashes_as_empty_content():
+    doc = fitz.open()
+    doc.new_page()
+    doc.new_page()
+    hashes = page_content_hashes(doc)
+    assert len(hashes) == 2 and hashes[0] == hashes[1]
+
+
+def test_revision_with_inserted_blank_page_is_diffed(tmp_path, make_pdf, draw_ruled_form):
+    previous_path = make_pdf(draw_ruled_form(3), "previous.pdf")
+    revised = fitz.open(previous_path)
+    revised.new_page(pno=0)  # Addendum cover sheet left blank
+    revised_path = make_pdf(revised, "revised.pdf")
+
+    previous_fields = [{"field_name": "Field label A", "field_type": "text", "is_required": False, "page_number": 1,
+                        "coordinates": [{"x": 0.3, "y": 0.1}, {"x": 0.7, "y": 0.1}, {"x": 0.7, "y": 0.15}, {"x": 0.3, "y": 0.15}]}]
+    blueprint_path = tmp_path / "previous_blueprint.json"
+    blueprint_path.write_text(json.dumps({"form_fields": previous_fields}))
+
+    with fitz.open(previous_path) as previous_doc, fitz.open(revised_path) as revised_doc:
+        assert match_unchanged_pages(page_content_hashes(previous_doc), page_content_hashes(revised_doc)) == {1: 0}
+
+    response = json.loads(tools.analyze_revised_document(revised_path, previous_path, str(blueprint_path)))
+    assert "error" not in response
+    assert response["carried_forward_pages"] == [2]
+    assert response["reanalyzed_pages"] == [1]
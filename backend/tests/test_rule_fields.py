@@ -0,0 +1,74 @@
+import json
+
+import fitz  # PyMuPDF
+
+from backend.agents.document_processing_agent import tools
+
+
+def _blueprint(tmp_path, fields):
+    path = tmp_path / "blueprint.json"
+    path.write_text(json.dumps({"form_fields": fields}))
+    return str(path)
+
+
+def test_rule_fields_have_height(draw_ruled_form):
+    doc = draw_ruled_form(4)
+    fields = tools._extract_page_fields(doc[0], 0, 1)
+    assert len(fields) == 4
+    for field in fields:
+        top, bottom = field["coordinates"][0]["y"], field["coordinates"][2]["y"]
+        assert (bottom - top) * doc[0].rect.height >= tools.MIN_FIELD_HEIGHT
+
+
+def test_one_widget_per_detected_rule(tmp_path, make_pdf, draw_ruled_form):
+    pdf_path = make_pdf(draw_ruled_form(6))
+    with fitz.open(pdf_path) as doc:
+        fields = tools._extract_page_fields(doc[0], 0, 1, engine="vector")
+    assert len(fields) == 6
+
+    response = json.loads(tools.create_fields_from_blueprint(pdf_path, _blueprint(tmp_path, fields)))
+    with fitz.open(response["path"]) as created:
+        assert len(list(created[0].widgets())) == 6
+
+
+def test_raster_rule_fields_become_widgets(tmp_path, make_pdf, draw_ruled_form):
+    pdf_path = make_pdf(draw_ruled_form(3, line_spacing=60, rule_offset=20))
+    with fitz.open(pdf_path) as doc:
+        fields = tools._extract_page_fields(doc[0], 0, 1, engine="raster")
+    assert len(fields) == 3
+
+    response = json.loads(tools.create_fields_from_blueprint(pdf_path, _blueprint(tmp_path, fields)))
+    with fitz.open(response["path"]) as created:
+        assert len(list(created[0].widgets())) == 3
+
+
+def test_jsonl_summary_lists_field_names(draw_ruled_form, make_pdf):
+    pdf_path = make_pdf(draw_ruled_form(3))
+
+    summary = json.loads(tools.extract_fields_with_local_heuristics_to_jsonl(pdf_path, engine="vector"))
+
+    assert summary["field_count"] == 3
+    assert summary["field_names"] == [field["field_name"] for field in tools._iter_blueprint_fields(summary["blueprint_path"])]
+    assert "field_names_truncated" not in summary
+
+
+def test_blueprint_handles_are_never_overwritten(draw_ruled_form, tmp_path):
+    first_dir, second_dir = tmp_path / "first", tmp_path / "second"
+    first_dir.mkdir()
+    second_dir.mkdir()
+    doc = draw_ruled_form(3)
+    first_pdf = str(first_dir / "form.pdf")
+    doc.save(first_pdf)
+    # Another upload with the same file name but a different form
+    doc = draw_ruled_form(2, label_prefix="Other label")
+    second_pdf = str(second_dir / "form.pdf")
+    doc.save(second_pdf)
+
+    local = json.loads(tools.extract_fields_with_local_heuristics(first_pdf))
+    triage = json.loads(tools.analyze_document_with_page_triage(first_pdf))
+    other_upload = json.loads(tools.extract_fields_with_local_heuristics(second_pdf))
+
+    paths = {local["blueprint_path"], triage["blueprint_path"], other_upload["blueprint_path"]}
+    assert len(paths) == 3
+    assert [field["field_name"] for field in tools._iter_blueprint_fields(local["blueprint_path"])] == local["field_names"]
+    assert other_upload["field_count"] == 2
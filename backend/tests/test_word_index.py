@@ -0,0 +1,20 @@
+import fitz  # PyMuPDF
+
+from backend.agents.document_processing_agent import tools
+from backend.agents.document_processing_agent.word_index import PageWordIndex
+
+
+def test_query_leaves_out_lines_that_graze_the_window(draw_ruled_form):
+    doc = draw_ruled_form(3)
+    page = doc[0]
+    index = PageWordIndex(page.get_text("words"))
+    # The label window the heuristics use around the middle rule (drawn at y=127)
+    label_rect = fitz.Rect(200 - 300, 127 - 15, 200 - 5, 127 + 15)
+    assert " ".join(w[4] for w in index.query(label_rect)) == "Field label B:"
+    assert [w[4] for w in index.query(label_rect)] == [w[4] for w in page.get_text("words", clip=label_rect)]
+
+
+def test_stacked_labelled_lines_keep_their_own_labels(draw_ruled_form):
+    doc = draw_ruled_form(3)
+    fields = tools._extract_page_fields(doc[0], 0, 1)
+    assert [f["field_name"] for f in fields] == ["Field label A", "Field label B", "Field label C"]